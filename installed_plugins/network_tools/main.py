@@ -25,10 +25,9 @@ from django.utils.translation import ugettext as _
 
 from netadmin.plugins import Plugin, Widget
 from netadmin.plugins.options import get_option
-from netadmin.shortcuts import get_host, get_hosts, get_alerts, get_events, \
-    get_networks, get_network
+from netadmin.shortcuts import get_host, get_hosts, get_alerts, \
+    get_events_histogram, get_networks, get_network
 from netadmin.utils.charts import ColumnChart, NumberColumn, DateColumn
-from netadmin.utils.timehelper import date_iterator 
 
 
 class HostWidget(Widget):
@@ -75,14 +74,10 @@ class HostWidget(Widget):
     def context(self, widget):
         days = self.get_option('host_detail_widget_days', widget)
         date_from = datetime.date.today() - timedelta(days=days-1)
-        days_range = list(date_iterator(date_from))
         
         host = self.get_option('host_detail_widget_host', widget)
-        events_count = []
-        for day in days_range: 
-            next_day = day + timedelta(days=1)
-            events = get_events(source_hosts=[host], time_from=day, time_to=next_day)
-            events_count.append(events.count())
+        days_range, events_count = get_events_histogram(date_from,
+                                                        source_hosts=[host])
         
         chart = ColumnChart(_("Number of events per day"))
         chart.add_column(_("Day"), days_range, DateColumn)
@@ -133,15 +128,10 @@ class NetworkWidget(Widget):
     def context(self, widget):
         days = self.get_option('network_detail_widget_days', widget)
         date_from = datetime.date.today() - timedelta(days=days-1)
-        days_range = list(date_iterator(date_from))
         
         network = self.get_option('network_detail_widget_network', widget)
-        events_count = []
-        for day in days_range: 
-            next_day = day + timedelta(days=1)
-            hosts = network.hosts()
-            events = get_events(source_hosts=hosts, time_from=day, time_to=next_day)
-            events_count.append(events.count())
+        days_range, events_count = get_events_histogram(date_from,
+            source_hosts=network.hosts())
         
         chart = ColumnChart(_("Number of events per day"))
         chart.add_column(_("Day"), days_range, DateColumn)
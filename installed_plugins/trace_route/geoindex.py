@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compiled GeoIP data used by the trace route widget.
+
+The CSV files are converted once into two files:
+
+    * GeoIPCountryWhois.bin - sorted table of IPv4 ranges, every record
+      holds numeric bounds of the range and country code, so the country
+      of an address is found with a binary search over the memory-mapped
+      file,
+    * GeoLiteCity-Location.json - dictionary mapping country codes
+      to coordinates.
+
+Files should be compiled when the plugin is installed or the CSV files are
+updated, by running in this directory:
+
+    python geoindex.py
+
+Otherwise they are compiled by the first request which needs them, and
+again whenever the CSV files are newer.
+"""
+
+import csv
+import mmap
+import os
+import struct
+import tempfile
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+
+LOCATION = os.path.realpath(os.path.dirname(__file__))
+
+RANGES_CSV = os.path.join(LOCATION, 'GeoIPCountryWhois.csv')
+RANGES_BIN = os.path.join(LOCATION, 'GeoIPCountryWhois.bin')
+LOCATIONS_CSV = os.path.join(LOCATION, 'GeoLiteCity-Location.csv')
+LOCATIONS_JSON = os.path.join(LOCATION, 'GeoLiteCity-Location.json')
+
+# range start, range end, country code
+RECORD = struct.Struct('>II2s')
+
+
+def compile_ranges(csv_path=RANGES_CSV, bin_path=RANGES_BIN):
+    """Converts ranges from the GeoIP CSV file into the binary table"""
+    f = open(csv_path, 'rb')
+    try:
+        ranges = [(int(row[2]), int(row[3]), row[4][:2])
+                  for row in csv.reader(f)]
+    finally:
+        f.close()
+    ranges.sort()
+
+    def write(output):
+        for record in ranges:
+            output.write(RECORD.pack(*record))
+    _write_file(bin_path, write)
+
+def compile_locations(csv_path=LOCATIONS_CSV, json_path=LOCATIONS_JSON):
+    """
+    Converts locations CSV file into the dictionary mapping country codes
+    to coordinates; country-wide locations (without region and city) are
+    preferred over the first city found for a country
+    """
+    locations = {}
+    f = open(csv_path, 'rb')
+    try:
+        for row in csv.reader(f):
+            if len(row) < 7 or not row[5] or not row[6]:
+                continue
+            country = row[1]
+            country_wide = not row[2] and not row[3]
+            if country not in locations or country_wide:
+                locations[country] = [row[5], row[6]]
+    finally:
+        f.close()
+
+    _write_file(json_path, lambda output: json.dump(locations, output))
+
+def _write_file(path, write):
+    """
+    Writes file with the write function into a unique temporary file and
+    renames it to path, so processes reading the file (or compiling it at
+    the same time) never see partly written data
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        output = os.fdopen(fd, 'wb')
+        try:
+            write(output)
+        finally:
+            output.close()
+        # mkstemp creates files readable only by the owner
+        os.chmod(tmp_path, 0644)
+        os.rename(tmp_path, path)
+    except:
+        os.remove(tmp_path)
+        raise
+
+def _is_stale(source, target):
+    if not os.path.exists(target):
+        return True
+    return os.path.getmtime(source) > os.path.getmtime(target)
+
+
+class GeoIndex(object):
+    """Country and coordinates lookups over compiled GeoIP files"""
+
+    def __init__(self, bin_path=RANGES_BIN, json_path=LOCATIONS_JSON):
+        f = open(bin_path, 'rb')
+        try:
+            if os.path.getsize(bin_path):
+                self.ranges = mmap.mmap(f.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+            else:
+                self.ranges = ''
+        finally:
+            f.close()
+        self.size = len(self.ranges) // RECORD.size
+
+        f = open(json_path, 'rb')
+        try:
+            self.locations = json.load(f)
+        finally:
+            f.close()
+
+    def _record(self, i):
+        return RECORD.unpack_from(self.ranges, i * RECORD.size)
+
+    def country(self, address):
+        """
+        Returns country code of the IPv4 address given as integer
+        or None if it's unknown
+        """
+        if address is None:
+            return None
+        # find the last range starting at or before the address
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle)[0] <= address:
+                low = middle + 1
+            else:
+                high = middle
+        if not low:
+            return None
+        start, end, country = self._record(low - 1)
+        if address > end:
+            return None
+        return country
+
+    def coordinates(self, country):
+        """Returns [latitude, longitude] of the country or None"""
+        return self.locations.get(country)
+
+
+_index = None
+
+def get_index():
+    """
+    Returns GeoIndex shared by the process, compiling data files first if
+    they are missing or outdated. Returns None if there is no GeoIP data.
+    """
+    global _index
+    if _index is not None:
+        return _index
+    if os.path.exists(RANGES_CSV) and _is_stale(RANGES_CSV, RANGES_BIN):
+        compile_ranges()
+    if os.path.exists(LOCATIONS_CSV) and \
+       _is_stale(LOCATIONS_CSV, LOCATIONS_JSON):
+        compile_locations()
+    if not os.path.exists(RANGES_BIN) or not os.path.exists(LOCATIONS_JSON):
+        return None
+    _index = GeoIndex()
+    return _index
+
+
+if __name__ == '__main__':
+    compile_ranges()
+    compile_locations()
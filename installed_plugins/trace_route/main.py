@@ -30,8 +30,7 @@ from netadmin.shortcuts import get_host, get_hosts, get_alerts, get_events, \
     get_networks, get_network
 from netadmin.utils.charts import ColumnChart, NumberColumn, DateColumn
 from netadmin.utils.timehelper import date_iterator
-import csv
-import os
+from installed_plugins.trace_route.geoindex import get_index
 
 class TraceRoute(Plugin):
 	name = "Web Trace Route"
@@ -47,48 +46,22 @@ class TraceRouteWidget(Widget):
 	name = "Trace Route Widget"
 	description = "Basic Information Show On Map"
 	template_name = "map.html"
-	__location__ = os.path.realpath(
-			os.path.join(os.getcwd(), os.path.dirname(__file__)))
 		
 	def get_title(self):
 		return "Trace Route"
 
 	def context(self, widget):
 		user = widget.widgets_area.user
-		#hosts = get_hosts(user=user)
-		geoIP = []
 		geo_final = []
-		for host in get_hosts(user=user):
-		 geo_range = self.range_check(host.ipv4)
-		 if geo_range:
-			geoIP.append( '%s' % (geo_range[0][0]) )
-		if geoIP:
-			geo_LatLng = self.get_LatLng(geoIP)
-		if geo_LatLng:
-			for i in range(0,len(geo_LatLng)):
-				geo_final.append( '[%s,%s], ' % (geo_LatLng[i][0], geo_LatLng[i][1]))
+		index = get_index()
+		if index:
+			addresses = get_hosts(user=user).values_list('ipv4_int', flat=True)
+			for address in addresses.iterator():
+				geo_LatLng = index.coordinates(index.country(address))
+				if geo_LatLng:
+					geo_final.append('[%s,%s], ' % (geo_LatLng[0], geo_LatLng[1]))
+					if len(geo_final) == 10:
+						break
 		return {
-		'geoIP': geo_final[:10]
+		'geoIP': geo_final
 		}
-
-	def range_check(self, the_ip):
-		rowx = []
-		f = open(os.path.join(self.__location__, 'GeoIPCountryWhois.csv'))
-		for num,row in enumerate(csv.reader(f)):
-			if row[0] <= the_ip <= row[1]:
-				rowx.append([row[4]])
-				return rowx
-			else:
-				continue       
-		return rowx
-	
-	def get_LatLng(self, the_country):
-		rowy = []
-		for x in range(0,len(the_country)):
-			d = open(os.path.join(self.__location__, 'GeoLiteCity-Location.csv'))
-			for num,row in enumerate(csv.reader(d)):
-				if row[1]== the_country[x].strip():
-					rowy.append([row[5],row[6]])
-		return rowy
-					
-    
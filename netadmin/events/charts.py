@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Charts presenting events statistics. Data of every chart comes from a single
+aggregated query and, if a user is given, it is cached for a short time.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils.translation import ugettext as _
+
+from netadmin.events.models import Event
+from netadmin.utils.charts import LineChart, PieChart, TimeSeries, \
+    DateColumn, NumberColumn, StringColumn
+
+
+# number of seconds statistics of a user are cached for
+EVENTS_STATS_CACHE_TIMEOUT = getattr(settings, 'EVENTS_STATS_CACHE_TIMEOUT',
+                                     60)
+
+
+def cached_stats(key, user, func):
+    """
+    Returns result of func(), cached under the key for the user;
+    without user the result is not cached
+    """
+    if not user:
+        return func()
+    key = 'events_stats:%s:%s' % (user.pk, key)
+    data = cache.get(key)
+    if data is None:
+        data = func()
+        cache.set(key, data, EVENTS_STATS_CACHE_TIMEOUT)
+    return data
+
+
+class EventTypesChart(LineChart):
+    """Number of events of every type per day, in the last days
+    """
+    def __init__(self, days, event_types, user=None, *args, **kwargs):
+        title = _("Events in the last %i days") % days
+        super(EventTypesChart, self).__init__(title, *args, **kwargs)
+
+        def get_data():
+            date_to = datetime.date.today() + datetime.timedelta(days=1)
+            date_from = date_to - datetime.timedelta(days=days)
+            events = Event.objects.filter(event_type__in=event_types)
+            series = TimeSeries(events, date_from, date_to, bucket='day',
+                                group_by='event_type__name')
+            return series.labels, series.groups
+
+        labels, groups = cached_stats('types:%i' % days, user, get_data)
+        self.add_column(_("Day"), labels, DateColumn)
+        for name in sorted(groups):
+            self.add_column(name, groups[name], NumberColumn)
+        if not groups:
+            self.add_column(_("Events"), [0] * len(labels), NumberColumn)
+
+
+class EventTypesCountChart(PieChart):
+    """Total number of events of every type
+    """
+    def __init__(self, event_types, user=None, *args, **kwargs):
+        title = _("Events by type")
+        super(EventTypesCountChart, self).__init__(title, *args, **kwargs)
+
+        def get_data():
+            events = Event.objects.filter(event_type__in=event_types)
+            counts = events.values('event_type__name').order_by() \
+                .annotate(count=Count('pk'))
+            return sorted((row['event_type__name'], row['count'])
+                          for row in counts)
+
+        data = cached_stats('count', user, get_data)
+        self.add_column(_("Event type"), [name for name, count in data],
+                        StringColumn)
+        self.add_column(_("Events"), [count for name, count in data],
+                        NumberColumn)
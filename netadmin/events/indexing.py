@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Incremental updates of the events search index (haystack only; nonrel
+search indexes are updated by the search app itself). Saved and deleted
+events are queued by QueuedSearchIndex and the queue is applied to the
+index in batches:
+
+    python manage.py update_events_index --daemon
+
+Full rebuild is done in batches of events ordered by primary key and the
+last indexed key is stored, so an interrupted rebuild continues where it
+stopped.
+"""
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from netadmin.events.models import Event, EventIndexUpdate, EventIndexState
+from netadmin.networks.models import Host
+from netadmin.permissions.utils import sharing_user_ids_map
+
+
+EVENTS_INDEX_BATCH_SIZE = getattr(settings, 'EVENTS_INDEX_BATCH_SIZE', 500)
+
+
+def enqueue_update(sender, instance, **kwargs):
+    EventIndexUpdate.objects.create(event_id=instance.pk)
+
+def enqueue_delete(sender, instance, **kwargs):
+    EventIndexUpdate.objects.create(event_id=instance.pk, deleted=True)
+
+def enqueue_host_events(sender, instance, **kwargs):
+    """
+    Queues events of the host when a permission on the host is granted or
+    revoked, as indexed events store ids of users who may access them.
+    A single queue item is saved; it is expanded by process_queue.
+    """
+    if instance.content_type_id != ContentType.objects.get_for_model(Host).pk:
+        return
+    EventIndexUpdate.objects.create(host_id=instance.object_id)
+
+def get_index():
+    from haystack import site
+    return site.get_index(Event)
+
+def get_identifier(event_id):
+    return u'%s.%s.%s' % (Event._meta.app_label, Event._meta.module_name,
+                          event_id)
+
+def update_events(index, events):
+    """
+    Updates events in the index; ids of users sharing source hosts of the
+    events are fetched once for all of them
+    """
+    events = list(events)
+    if not events:
+        return
+    host_ids = set(event.source_host_id for event in events)
+    index.users_cache = sharing_user_ids_map(Host, host_ids)
+    try:
+        index.backend.update(index, events)
+    finally:
+        index.users_cache = None
+
+@transaction.commit_on_success
+def process_queue(batch_size=EVENTS_INDEX_BATCH_SIZE):
+    """
+    Applies up to batch_size queued changes to the search index and returns
+    the number of processed queue items. Only the latest change of every
+    event is applied; all events of hosts queued as a whole are updated
+    in batches of batch_size events.
+    """
+    items = list(EventIndexUpdate.objects.order_by('pk')[:batch_size])
+    if not items:
+        return 0
+
+    deleted, host_ids = {}, set()
+    for item in items:
+        if item.host_id:
+            host_ids.add(item.host_id)
+        else:
+            deleted[item.event_id] = item.deleted
+    updated_ids = [pk for pk, is_deleted in deleted.iteritems()
+                   if not is_deleted]
+
+    index = get_index()
+    if updated_ids:
+        update_events(index, index.index_queryset().filter(pk__in=updated_ids))
+    for pk, is_deleted in deleted.iteritems():
+        if is_deleted:
+            index.backend.remove(get_identifier(pk))
+
+    events = index.index_queryset().order_by('pk')
+    for host_id in host_ids:
+        last_pk = 0
+        while True:
+            batch = list(events.filter(source_host=host_id,
+                                       pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            update_events(index, batch)
+            last_pk = batch[-1].pk
+
+    EventIndexUpdate.objects.filter(pk__in=[item.pk for item in items]) \
+        .delete()
+    return len(items)
+
+def rebuild_index(batch_size=EVENTS_INDEX_BATCH_SIZE, resume=True,
+                  callback=None):
+    """
+    Indexes all events in batches and returns the number of indexed events.
+    Unless resume is True, the index is cleared and rebuilt from the first
+    event. The callback is called with the last indexed key after every
+    batch.
+    """
+    state, created = EventIndexState.objects.get_or_create(pk=1)
+    index = get_index()
+    if not resume:
+        index.backend.clear(models=[Event])
+        state.last_event_id = 0
+        state.save()
+
+    events = index.index_queryset().order_by('pk')
+    indexed = 0
+    while True:
+        batch = list(events.filter(pk__gt=state.last_event_id)[:batch_size])
+        if not batch:
+            break
+        update_events(index, batch)
+        state.last_event_id = batch[-1].pk
+        state.save()
+        transaction.commit_unless_managed()
+        indexed += len(batch)
+        if callback:
+            callback(state.last_event_id)
+    return indexed
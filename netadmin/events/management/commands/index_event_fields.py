@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from django.utils.translation import ugettext as _
+
+from netadmin.events.models import Event, EventFieldValue
+
+
+class Command(NoArgsCommand):
+
+    help = _(u"Rebuilds index of fields of events used by filter_fields")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--batch-size', dest='batch_size', type='int',
+                    default=1000,
+                    help=_(u"Number of events indexed in one transaction")),
+    )
+
+    def handle_noargs(self, **options):
+        batch_size = options.get('batch_size')
+        EventFieldValue.objects.all().delete()
+        events = Event.objects.exclude(fields_data=None) \
+            .exclude(fields_data='').order_by('pk')
+        indexed, last_pk = 0, 0
+        while True:
+            batch = list(events.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            self.index_batch(batch)
+            indexed += len(batch)
+            last_pk = batch[-1].pk
+
+        self.stdout.write(_(u"Fields of %i events indexed.\n") % indexed)
+
+    @transaction.commit_on_success
+    def index_batch(self, events):
+        for event in events:
+            event.index_fields(replace=False)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from django.utils.translation import ugettext as _
+
+from netadmin.events.models import Event, HostFieldName, EventFieldsNotValid, \
+    decode_fields
+
+
+class Command(NoArgsCommand):
+
+    help = _(u"Rebuilds catalog of field names reported by hosts")
+
+    def handle_noargs(self, **options):
+        catalog = {}
+        events = Event.objects.exclude(fields_data=None).exclude(fields_data='')
+        rows = events.values_list('source_host', 'fields_data').iterator()
+        for host_id, fields_data in rows:
+            try:
+                names = decode_fields(fields_data).keys()
+            except EventFieldsNotValid:
+                continue
+            catalog.setdefault(host_id, set()).update(names)
+
+        HostFieldName.objects.exclude(host__in=catalog.keys()).delete()
+        for host_id, names in catalog.iteritems():
+            self.rebuild_host(host_id, names)
+
+        self.stdout.write(_(u"Catalog rebuilt for %i hosts.\n") % len(catalog))
+
+    @transaction.commit_on_success
+    def rebuild_host(self, host_id, names):
+        HostFieldName.objects.filter(host=host_id).delete()
+        HostFieldName.objects.register(host_id, names)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import time
+from optparse import make_option
+
+from django import db
+from django.core.management.base import NoArgsCommand
+from django.utils.translation import ugettext as _
+
+from netadmin.events.indexing import process_queue, rebuild_index, \
+    EVENTS_INDEX_BATCH_SIZE
+
+
+class Command(NoArgsCommand):
+
+    help = _(u"Applies queued changes of events to the search index")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--daemon', action='store_true', dest='daemon',
+                    default=False,
+                    help=_(u"Keep running and update the index as soon as "
+                           u"events arrive")),
+        make_option('--interval', type='float', dest='interval', default=5,
+                    help=_(u"Time (in seconds) between checks of the empty "
+                           u"queue in daemon mode")),
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=EVENTS_INDEX_BATCH_SIZE,
+                    help=_(u"Number of events indexed at a time")),
+        make_option('--rebuild', action='store_true', dest='rebuild',
+                    default=False,
+                    help=_(u"Index all events, continuing the previous "
+                           u"rebuild if it was interrupted")),
+        make_option('--restart', action='store_true', dest='restart',
+                    default=False,
+                    help=_(u"With --rebuild: clear the index and start "
+                           u"from the first event")),
+    )
+
+    def handle_noargs(self, **options):
+        batch_size = options.get('batch_size')
+        verbosity = int(options.get('verbosity', 1))
+
+        if options.get('rebuild'):
+            def report(last_event_id):
+                if verbosity > 1:
+                    self.stdout.write(_(u"Indexed events up to %i.\n") %
+                                      last_event_id)
+                    self.stdout.flush()
+            indexed = rebuild_index(batch_size,
+                                    resume=not options.get('restart'),
+                                    callback=report)
+            self.stdout.write(_(u"%i events indexed.\n") % indexed)
+
+        if not options.get('daemon'):
+            processed = self.process(batch_size)
+            self.stdout.write(_(u"%i queued changes applied.\n") % processed)
+            return
+
+        self.stdout.write(_(u"Index updater started.\n"))
+        self.stdout.flush()
+        try:
+            while True:
+                processed = self.process(batch_size)
+                if processed and verbosity > 1:
+                    self.stdout.write(_(u"%i queued changes applied.\n") %
+                                      processed)
+                    self.stdout.flush()
+                db.reset_queries()
+                time.sleep(options.get('interval'))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(_(u"Index updater stopped.\n"))
+
+    def process(self, batch_size):
+        """Applies queued changes until the queue is empty"""
+        total = 0
+        while True:
+            processed = process_queue(batch_size)
+            total += processed
+            if processed < batch_size:
+                return total
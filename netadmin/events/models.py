@@ -23,7 +23,13 @@ try:
     import simplejson as json
 except ImportError:
     import json
+# C-accelerated decoder used for fields of events, if available
+try:
+    from ujson import loads as decode_json
+except ImportError:
+    decode_json = json.loads
 
+from django.conf import settings
 from django.db import models
 
 from django.utils.translation import ugettext as _
@@ -36,6 +42,10 @@ from netadmin.networks.models import Host
 from netadmin.users.models import UserProfile
 
 
+# if True, fields of events are stored in the EventFieldValue table
+EVENT_FIELDS_INDEX = getattr(settings, 'EVENT_FIELDS_INDEX', False)
+EVENT_FIELD_VALUE_LENGTH = 255
+
 ALERT_LEVELS = (
     (0, _('No alert')),
     (1, _('Low')),
@@ -51,6 +61,69 @@ class EventFieldsNotValid(Exception):
     pass
 
 
+def decode_fields(fields_data):
+    """
+    Returns dictionary of fields decoded from fields_data (empty one if
+    there is no data); raises EventFieldsNotValid if data is not valid
+    """
+    if not fields_data:
+        return {}
+    try:
+        fields = decode_json(fields_data)
+    except ValueError:
+        raise EventFieldsNotValid(_("Cannot decode fields data."))
+    if not isinstance(fields, dict):
+        raise EventFieldsNotValid(_("Cannot decode fields data."))
+    return fields
+
+
+def field_values(value):
+    """
+    Returns tuple (value_str, value_num) under which the field value is
+    stored in the fields index, or None if the value can't be indexed
+    """
+    if isinstance(value, bool):
+        return ('true' if value else 'false'), None
+    if isinstance(value, (int, long, float)):
+        return None, value
+    if isinstance(value, basestring):
+        return value[:EVENT_FIELD_VALUE_LENGTH], None
+    return None
+
+
+class EventQuerySet(models.query.QuerySet):
+
+    def filter_fields(self, **fields):
+        """
+        Filters events by values of their fields, e.g.
+        events.filter_fields(port=22, service='ssh'); the filtering is done
+        by the database, using the fields index
+        """
+        events = self
+        for name, value in fields.iteritems():
+            values = field_values(value)
+            if values is None:
+                raise ValueError(_("Cannot filter by value of the field "
+                                   "'%s'") % name)
+            value_str, value_num = values
+            related = EventFieldValue.objects.filter(name=name)
+            if value_num is None:
+                related = related.filter(value_str=value_str)
+            else:
+                related = related.filter(value_num=value_num)
+            events = events.filter(pk__in=related.values('event'))
+        return events
+
+class EventManager(models.Manager):
+    use_for_related_fields = True
+
+    def get_query_set(self):
+        return EventQuerySet(self.model, using=self._db)
+
+    def filter_fields(self, **fields):
+        return self.get_query_set().filter_fields(**fields)
+
+
 class EventTypeCategory(models.Model):
     """Represents category to which an event type may be assigned
 		
@@ -142,21 +215,60 @@ class Event(models.Model):
     fields_class = models.CharField(max_length=50, null=True, blank=True)
     fields_data = models.TextField(null=True, blank=True)
     checked = models.BooleanField(default=False)
+
+    objects = EventManager()
     
     def __unicode__(self):
         return "'%s' at %s" % (self.message, self.timestamp)
     
     def save(self, *args, **kwargs):
-        if not self.pk:
+        created = not self.pk
+        if created:
             self.message_slug = slugify(self.short_message)
         super(Event, self).save(*args, **kwargs)
+        if created and self.fields_data:
+            try:
+                names = self.get_details().keys()
+            except EventFieldsNotValid:
+                names = []
+            HostFieldName.objects.register(self.source_host_id, names)
+            if EVENT_FIELDS_INDEX:
+                self.index_fields(replace=False)
 
-    def get_details(self):
-        """Returns event details extracted from monitoring module fields"""
+    def index_fields(self, replace=True):
+        """
+        Stores values of fields of the event in the fields index; if replace
+        is True, values indexed earlier are removed first
+        """
+        if replace:
+            EventFieldValue.objects.filter(event=self).delete()
         try:
-            fields = json.loads(self.fields_data)
-        except ValueError:
-            raise EventFieldsNotValid(_("Cannot decode fields data."))
+            fields = self.get_details()
+        except EventFieldsNotValid:
+            return
+        values = []
+        for name, value in fields.iteritems():
+            indexed = field_values(value)
+            if indexed is not None:
+                values.append(EventFieldValue(event=self, name=name[:100],
+                    value_str=indexed[0], value_num=indexed[1]))
+        if hasattr(EventFieldValue.objects, 'bulk_create'):
+            EventFieldValue.objects.bulk_create(values)
+        else:
+            for value in values:
+                value.save()
+
+    def get_details(self):
+        """
+        Returns event details extracted from monitoring module fields.
+        Fields are decoded once and the result is reused until fields_data
+        changes, so it should not be modified by callers.
+        """
+        cached = getattr(self, '_fields_cache', None)
+        if cached and cached[0] is self.fields_data:
+            return cached[1]
+        fields = decode_fields(self.fields_data)
+        self._fields_cache = (self.fields_data, fields)
         return fields
     fields = property(get_details)
     
@@ -194,6 +306,13 @@ class Event(models.Model):
         """Notifier support: returns event data in HTML"""
         title = '%s %s' % (str(self.timestamp), self.event_type.name)
         return '<h2>%s</h2><p>%s</p>' % (title, self.html_message)
+
+    def get_notification_key(self):
+        """
+        Notifier support: notifications about events of the same type
+        reported by the same host are merged together
+        """
+        return '%s:%s' % (self.event_type_id, self.source_host_id)
     
     def api_detail(self):
         return {
@@ -214,6 +333,56 @@ class Event(models.Model):
             'short_description': self.short_message
         }
 
+class EventFieldValue(models.Model):
+    """
+    Index of fields of events: every scalar field of an event is stored
+    as a separate row with the value kept in a column of matching type,
+    so events may be filtered by fields in the database (see
+    EventQuerySet.filter_fields). Composite indexes on (name, value_str)
+    and (name, value_num) are created by sql/eventfieldvalue.sql.
+    """
+    event = models.ForeignKey(Event)
+    name = models.CharField(max_length=100)
+    value_str = models.CharField(max_length=EVENT_FIELD_VALUE_LENGTH,
+                                 null=True, blank=True)
+    value_num = models.FloatField(null=True, blank=True)
+
+    def __unicode__(self):
+        return u"%s=%s" % (self.name, self.value_num if self.value_str is None
+                           else self.value_str)
+
+class HostFieldNameManager(models.Manager):
+
+    def register(self, host_id, names):
+        """
+        Adds field names to the catalog of the host; only names that are
+        not known yet are inserted (truncated to the column length)
+        """
+        names = set(name[:100] for name in names)
+        if not names:
+            return
+        known = self.filter(host=host_id, name__in=names)
+        known = set(known.values_list('name', flat=True))
+        for name in names - known:
+            self.get_or_create(host_id=host_id, name=name)
+
+class HostFieldName(models.Model):
+    """
+    Catalog of names of fields reported in events of the host. It is
+    maintained when events are created, so that Host.fields() doesn't
+    have to decode fields of all events.
+    """
+    host = models.ForeignKey(Host)
+    name = models.CharField(max_length=100)
+
+    objects = HostFieldNameManager()
+
+    class Meta:
+        unique_together = ('host', 'name')
+
+    def __unicode__(self):
+        return self.name
+
 class EventComment(models.Model):
     comment = models.TextField()
     user = models.CharField(max_length=30, null = False, blank=True)
@@ -222,3 +391,33 @@ class EventComment(models.Model):
     
     def __unicode__(self):
         return "'%s' at %s" % (self.comment)
+
+class EventIndexUpdate(models.Model):
+    """
+    Queue of changes waiting to be applied to the search index. Events are
+    queued when they are saved or deleted and the queue is processed in
+    batches by the update_events_index command (see events.indexing).
+    Items with host_id instead of event_id stand for all events of the
+    host (queued when access to the host changes).
+    """
+    event_id = models.IntegerField(null=True, blank=True)
+    host_id = models.IntegerField(null=True, blank=True)
+    deleted = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __unicode__(self):
+        if self.host_id:
+            return u"update host %i" % self.host_id
+        return u"%s %i" % ('delete' if self.deleted else 'update',
+                           self.event_id)
+
+class EventIndexState(models.Model):
+    """
+    Progress of the search index rebuild: events with primary keys up to
+    last_event_id have been indexed, so interrupted rebuild may be resumed
+    """
+    last_event_id = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return unicode(self.last_event_id)
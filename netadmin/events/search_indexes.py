@@ -29,10 +29,48 @@ except ImportError:
     from haystack import indexes
     from haystack import site
 
-    class EventIndex(indexes.SearchIndex):
+    from django.db.models import signals
+    from indexing import enqueue_update, enqueue_delete, enqueue_host_events
+    from netadmin.permissions.models import ObjectPermission
+    from netadmin.permissions.utils import sharing_user_ids
+
+    class QueuedSearchIndex(indexes.SearchIndex):
+        """
+        Search index which doesn't update the backend when objects are
+        saved or deleted, but queues them for the update_events_index command
+        """
+        def _setup_save(self, model):
+            signals.post_save.connect(enqueue_update, sender=model)
+
+        def _setup_delete(self, model):
+            signals.post_delete.connect(enqueue_delete, sender=model)
+
+        def _teardown_save(self, model):
+            signals.post_save.disconnect(enqueue_update, sender=model)
+
+        def _teardown_delete(self, model):
+            signals.post_delete.disconnect(enqueue_delete, sender=model)
+
+    class EventIndex(QueuedSearchIndex):
         text = indexes.CharField(document=True, use_template=True)
+        # ids of users who have access to the source host; search results
+        # are filtered by this field in the search engine
+        users = indexes.MultiValueField()
+
+        # ids of users sharing hosts, set by indexing.update_events for
+        # the events being indexed
+        users_cache = None
+
+        def prepare_users(self, obj):
+            if self.users_cache and obj.source_host_id in self.users_cache:
+                return self.users_cache[obj.source_host_id]
+            return sharing_user_ids(obj.source_host)
 
         def index_queryset(self):
             return Event.objects.all()
 
     site.register(Event, EventIndex)
+
+    # access to events changes together with access to their hosts
+    signals.post_save.connect(enqueue_host_events, sender=ObjectPermission)
+    signals.post_delete.connect(enqueue_host_events, sender=ObjectPermission)
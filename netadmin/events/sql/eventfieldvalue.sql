@@ -0,0 +1,3 @@
+-- Indexes used to filter events by fields (see EventQuerySet.filter_fields)
+CREATE INDEX events_eventfieldvalue_str ON events_eventfieldvalue (name, value_str);
+CREATE INDEX events_eventfieldvalue_num ON events_eventfieldvalue (name, value_num);
@@ -53,24 +53,36 @@ def alerts_counter(user_id):
     return {'alert_levels': alert_levels_list}
 
 @register.inclusion_tag('events/events_list_tag.html')
-def events_list(request, events, title=None, page=None):
-    paginator = Paginator(list(events), 20)
+def events_list(request, events, title=None, page=None, page_param='page'):
+    paginator = Paginator(events, 20)
     
-    page = page or request.GET.get('page', 1)
+    page = page or request.GET.get(page_param, 1)
     try:
         events = paginator.page(page)
     except PageNotAnInteger:
         events = paginator.page(1)
     except EmptyPage:
         events = paginator.page(paginator.num_pages)
+
+    # links to other pages keep the remaining query parameters
+    params = request.GET.copy()
+    params.pop(page_param, None)
+    query = params.urlencode()
     
     context = {
         'events': events,
         'title': title,
-        'request': request
+        'request': request,
+        'page_url': '%s?%s%s=' % (request.path, query + '&' if query else '',
+                                  page_param)
     }
     return context
 
+@register.inclusion_tag('events/events_list_tag.html')
+def search_events_list(request, events):
+    """Events list on the search page, paginated with events_page"""
+    return events_list(request, events, page_param='events_page')
+
 @register.inclusion_tag('events/events_list_tag.html')
 def similar_events(request, event):
     event_type = event.event_type
@@ -22,8 +22,11 @@ import datetime
 
 from django.core.urlresolvers import reverse
 
-from netadmin.events.models import Event, EventType
+from netadmin.events import indexing
+from netadmin.events.models import Event, EventType, EventIndexUpdate
 from netadmin.networks.models import Host
+from netadmin.shortcuts import get_events_histogram
+from netadmin.utils.charts import TimeSeries
 from netadmin.utils.testutils import EventBaseTest
 from netadmin.users.models import UserProfile
 
@@ -86,3 +89,135 @@ class EventTest(EventBaseTest):
         
         self.source_host.user = self.user
         self.source_host.save()
+
+    def test_events_histogram(self):
+        """Events should be counted per day, including days without events
+        """
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+        days, counts = get_events_histogram(yesterday,
+                                            source_hosts=[self.source_host])
+        self.assertEqual(days, [yesterday, today])
+        self.assertEqual(counts, [0, 1])
+
+        hosts = Host.objects.filter(pk=self.source_host.pk)
+        self.assertEqual(get_events_histogram(today, source_hosts=hosts),
+                         ([today], [1]))
+        hosts = Host.objects.none()
+        self.assertEqual(get_events_histogram(today, source_hosts=hosts),
+                         ([today], [0]))
+
+    def test_time_series(self):
+        """
+        Events should be counted in buckets, with empty buckets filled
+        and merged when there are too many of them
+        """
+        Event.objects.all().delete()
+        other_type = EventType.objects.create(name='WARNING', user=self.user)
+        date = datetime.datetime(2012, 3, 5, 10)
+        for minutes, event_type in [(5, self.event.event_type),
+                                    (65, self.event.event_type),
+                                    (70, other_type), (190, other_type)]:
+            Event.objects.create(message='Message', short_message='message',
+                event_type=event_type, source_host=self.source_host,
+                timestamp=date + datetime.timedelta(minutes=minutes))
+
+        date_to = date + datetime.timedelta(hours=4)
+        series = TimeSeries(Event.objects.all(), date, date_to, bucket='hour')
+        self.assertEqual(series.labels,
+            [date + datetime.timedelta(hours=i) for i in xrange(4)])
+        self.assertEqual(series.counts, [1, 2, 0, 1])
+
+        series = TimeSeries(Event.objects.all(), date, date_to, bucket='hour',
+                            group_by='event_type')
+        self.assertEqual(series.groups[other_type.pk], [0, 1, 0, 1])
+
+        series = TimeSeries(Event.objects.all(), date, date_to, bucket='hour',
+                            max_points=2)
+        self.assertEqual(series.labels,
+                         [date, date + datetime.timedelta(hours=2)])
+        self.assertEqual(series.counts, [3, 1])
+
+    def test_events_stats(self):
+        """Statistics page should show charts with events of the user
+        """
+        response = self.client.get(reverse('events_stats'))
+        self.assertEqual(response.status_code, 200)
+
+        chart = response.context['eventtypes_chart']
+        self.assertEqual([column.name for column in chart.columns],
+                         ['Day', 'INFO'])
+        self.assertEqual(chart.columns[1].data[-1], 1)
+        chart = response.context['eventtypescount_chart']
+        self.assertEqual(chart.columns[1].data, [1])
+
+    def test_event_fields_cache(self):
+        """Fields should be decoded again only after fields_data has changed
+        """
+        self.event.fields_data = '{"port": 22}'
+        fields = self.event.get_details()
+        self.assertEqual(fields, {'port': 22})
+        self.assertTrue(self.event.get_details() is fields)
+        self.assertEqual(self.event.get_field('port'), 22)
+
+        self.event.fields_data = '{"port": 80}'
+        self.assertEqual(self.event.get_field('port'), 80)
+
+        self.event.fields_data = None
+        self.assertEqual(self.event.fields, {})
+
+    def test_filter_fields(self):
+        """Events should be filtered by fields in the database
+        """
+        ssh = Event.objects.create(message='ssh', short_message='ssh',
+            event_type=self.event.event_type, source_host=self.source_host,
+            timestamp=self.event.timestamp,
+            fields_data='{"port": 22, "service": "ssh", "open": true}')
+        http = Event.objects.create(message='http', short_message='http',
+            event_type=self.event.event_type, source_host=self.source_host,
+            timestamp=self.event.timestamp,
+            fields_data='{"port": 80, "service": "http"}')
+        for event in (ssh, http):
+            event.index_fields()
+
+        self.assertEqual(list(Event.objects.filter_fields(port=22)), [ssh])
+        events = Event.objects.filter(source_host=self.source_host)
+        self.assertEqual(list(events.filter_fields(service='ssh', open=True)),
+                         [ssh])
+        self.assertFalse(events.filter_fields(port=22, service='http'))
+        self.assertRaises(ValueError, events.filter_fields, port=[22])
+
+    def test_index_queue(self):
+        """Only the latest queued change of an event should be applied
+        """
+        class Backend(object):
+            def __init__(self):
+                self.updated, self.removed = [], []
+            def update(self, index, events):
+                self.updated.extend(events)
+            def remove(self, identifier):
+                self.removed.append(identifier)
+
+        class Index(object):
+            backend = Backend()
+            def index_queryset(self):
+                return Event.objects.all()
+
+        index = Index()
+        get_index = indexing.get_index
+        indexing.get_index = lambda: index
+        try:
+            EventIndexUpdate.objects.all().delete()
+            EventIndexUpdate.objects.create(event_id=self.event.pk)
+            EventIndexUpdate.objects.create(event_id=self.event.pk)
+            EventIndexUpdate.objects.create(event_id=-1)
+            EventIndexUpdate.objects.create(event_id=-1, deleted=True)
+            EventIndexUpdate.objects.create(host_id=self.source_host.pk)
+            self.assertEqual(indexing.process_queue(batch_size=10), 5)
+        finally:
+            indexing.get_index = get_index
+
+        self.assertEqual(index.backend.updated, [self.event, self.event])
+        self.assertEqual(index.backend.removed,
+                         [indexing.get_identifier(-1)])
+        self.assertFalse(EventIndexUpdate.objects.exists())
@@ -30,6 +30,7 @@ from django.utils.translation import ugettext as _
 
 from netadmin.permissions.utils import filter_user_objects
 from netadmin.networks.models import Host
+from netadmin.networks.utils import address_lookup
 from netadmin.events.models import Event, EventType
 
 
@@ -80,13 +81,9 @@ def get_event_data(request, event_dict):
         if hostname:
             source_host = Host.objects.get(name=hostname, user=request.user)
         else:
-            if ipv4 and ipv6:
-                source_host = Host.objects.get(ipv4=ipv4, ipv6=ipv6,
+            if ipv4 or ipv6:
+                source_host = Host.objects.get(address_lookup(ipv4, ipv6),
                                                user=request.user)
-            elif ipv4:
-                source_host = Host.objects.get(ipv4=ipv4, user=request.user)
-            elif ipv6:
-                source_host = Host.objects.get(ipv6=ipv6, user=request.user)
             else:
                 source_host = None
     except Host.DoesNotExist:
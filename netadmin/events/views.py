@@ -37,11 +37,13 @@ except ImportError:
 from forms import EventSearchForm, EventSearchSimpleForm,EventCommentForm, \
     EventTypeFormset, EventCheckForm, EventCategoryFormset, EventCommentFormset
 from models import Event, EventType, ALERT_LEVELS, EventTypeCategory, EventComment
+from charts import EventTypesChart, EventTypesCountChart
 from utils import filter_user_events
 import datetime
 now = datetime.datetime.now()
 
-from netadmin.permissions.utils import user_has_access
+from netadmin.networks.models import Host
+from netadmin.permissions.utils import user_has_access, user_object_ids
 from netadmin.webapi.views import api_ok, api_error
 from django.views.generic.create_update import update_object, delete_object
 
@@ -136,7 +138,9 @@ def events_search(request):
         cleaned_data = search_form.cleaned_data
         
         search_phrase = cleaned_data.get('message')
+        host_pks = user_object_ids(request.user, Host)
         events = search(Event, search_phrase)
+        events = events.filter(source_host__pk__in=host_pks)
         
         date_after = cleaned_data.get('date_after')
         if date_after:
@@ -151,8 +155,6 @@ def events_search(request):
             events = events.filter(event_type__pk=event_type)
             
         events = events.order_by('-timestamp')
-        # filter events by user access
-        events = filter(lambda e: user_has_access(e.source_host, request.user), events)
     else:
         if not request.GET.get('message'):
             search_form = EventSearchForm(request.user)
@@ -169,8 +171,8 @@ def events_search(request):
 def events_stats(request):
     eventtypes = EventType.objects.filter(user=request.user)
     
-    eventtypes_chart = EventTypesChart(7, eventtypes)
-    eventtypescount_chart = EventTypesCountChart(eventtypes)
+    eventtypes_chart = EventTypesChart(7, eventtypes, user=request.user)
+    eventtypescount_chart = EventTypesCountChart(eventtypes, user=request.user)
     
     context = {
         'eventtypes_chart': eventtypes_chart,
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.utils.translation import ugettext as _
+
+from netadmin.networks.models import Host
+from netadmin.networks.utils import ipv4_to_int, ipv6_to_hex
+
+
+class Command(NoArgsCommand):
+
+    help = _(u"Fills numeric address columns of hosts created before "
+             u"they were introduced")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=1000,
+                    help=_(u"Number of hosts fetched at once")),
+    )
+
+    def handle_noargs(self, **options):
+        batch_size = options['batch_size']
+        last_pk, updated = 0, 0
+        while True:
+            hosts = Host.objects.filter(pk__gt=last_pk).order_by('pk')
+            hosts = hosts.values_list('pk', 'ipv4', 'ipv6', 'ipv4_int',
+                                      'ipv6_hex')[:batch_size]
+            hosts = list(hosts)
+            if not hosts:
+                break
+            for pk, ipv4, ipv6, ipv4_int, ipv6_hex in hosts:
+                values = {'ipv4_int': ipv4_to_int(ipv4),
+                          'ipv6_hex': ipv6_to_hex(ipv6)}
+                if values != {'ipv4_int': ipv4_int, 'ipv6_hex': ipv6_hex}:
+                    Host.objects.filter(pk=pk).update(**values)
+                    updated += 1
+            last_pk = hosts[-1][0]
+
+        self.stdout.write(_(u"Updated %i hosts.\n") % updated)
@@ -20,14 +20,15 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
 from django.db.models import permalink
 from django.utils.translation import ugettext as _
 import datetime
 from django.core.exceptions import ValidationError
 
 from netadmin.permissions.utils import SharedObject
-from utils import IPv6_validation, IPv4_validation
+from utils import IPv6_validation, IPv4_validation, ipv4_to_int, \
+    ipv6_to_hex
 
 
 
@@ -74,11 +75,21 @@ class Host(NetworkObject):
                             validators=[IPv4_validation])
     ipv6 = models.CharField(max_length=39, verbose_name=_("IPv6 address"), 
                             blank=True, validators=[IPv6_validation])
+    # numeric forms of addresses, used for exact and range lookups
+    ipv4_int = models.BigIntegerField(null=True, editable=False,
+                                      db_index=True)
+    ipv6_hex = models.CharField(max_length=32, null=True, editable=False,
+                                db_index=True)
 
     @permalink
     def get_absolute_url(self):
        # import pdb;pdb.set_trace()
         return ('host_detail', [str(self.pk)])
+
+    def save(self, *args, **kwargs):
+        self.ipv4_int = ipv4_to_int(self.ipv4)
+        self.ipv6_hex = ipv6_to_hex(self.ipv6)
+        super(Host, self).save(*args, **kwargs)
     
     def delete(self, *args, **kwargs):
         #import pdb;pdb.set_trace()
@@ -96,28 +107,20 @@ class Host(NetworkObject):
         super(Host, self).delete(*args, **kwargs)
     
     def networks(self):
-        nethost = self.networkhost_set.all().only('id')
-        nets = [nh.network.pk for nh in nethost]
-        return Network.objects.filter(pk__in=nets)
+        """Returns all networks the host belongs to
+        """
+        networks = self.networkhost_set.values('network')
+        return Network.objects.filter(pk__in=networks)
     
     def fields(self):
-        from netadmin.events.models import EventFieldsNotValid
-        fields_list = []
-        for event in self.events():
-            try:
-                for field in event.fields.keys():
-                    if field not in fields_list:
-                        fields_list.append(field)
-            except EventFieldsNotValid:
-                pass
-        return fields_list
+        """Returns names of fields reported in events of the host
+        """
+        from netadmin.events.models import HostFieldName
+        names = HostFieldName.objects.filter(host=self).order_by('name')
+        return list(names.values_list('name', flat=True))
     
     def in_network(self, network):
-        try:
-            nh = self.networkhost_set.get(network=network)
-        except NetworkHost.DoesNotExist:
-            return False
-        return True
+        return self.networkhost_set.filter(network=network).exists()
     
     def api_detail(self):
         #import pdb;pdb.set_trace()
@@ -143,9 +146,8 @@ class Network(NetworkObject):
     def hosts(self):
         """Returns all hosts in the network
         """
-        related = self.networkhost_set.all()
-        hosts_ids = [rel.host.pk for rel in related]
-        return Host.objects.filter(pk__in=hosts_ids)
+        hosts = self.networkhost_set.values('host')
+        return Host.objects.filter(pk__in=hosts)
 
     def add_host(self, host):
         """Creates relation between host and network
@@ -155,6 +157,38 @@ class Network(NetworkObject):
         except NetworkHost.DoesNotExist:
             return NetworkHost.objects.create(network=self, host=host)
 
+    @transaction.commit_on_success
+    def set_hosts(self, hosts):
+        """
+        Makes given hosts (objects or primary keys) the only members of the
+        network. Only differences are applied to the database: new relations
+        are inserted at once and removed ones are deleted with a single
+        query, existing relations are left untouched. Returns tuple
+        (added, removed) with numbers of changed relations.
+        """
+        new_ids = set()
+        for host in hosts:
+            try:
+                new_ids.add(int(getattr(host, 'pk', host)))
+            except (TypeError, ValueError):
+                # e.g. blank values submitted with a form
+                continue
+        related = self.networkhost_set.values_list('host', flat=True)
+        current_ids = set(related)
+
+        removed = current_ids - new_ids
+        if removed:
+            self.networkhost_set.filter(host__in=removed).delete()
+
+        added = new_ids - current_ids
+        if added:
+            # ignore keys of hosts that don't exist
+            added = Host.objects.filter(pk__in=added) \
+                .values_list('pk', flat=True)
+            added = list(added)
+            insert_network_hosts(self, added)
+        return len(added), len(removed)
+
     def remove_host(self, host):
         """Removes relation between host and network
         """
@@ -165,12 +199,14 @@ class Network(NetworkObject):
         relation.delete()
     
     def has_host(self, host):
-        return True if host in self.hosts() else False
+        return self.networkhost_set.filter(host=host).exists()
     
     def events(self):
+        """Returns events of all hosts in the network
+        """
         from netadmin.events.models import Event
-        hosts = self.hosts()
-        events = Event.objects.filter(source_host__in=list(hosts))
+        hosts = self.networkhost_set.values('host')
+        events = Event.objects.filter(source_host__in=hosts)
         return events.order_by('-timestamp')
     
     def api_detail(self):
@@ -180,6 +216,22 @@ class Network(NetworkObject):
             'network_description': self.description
         }
     
+def insert_network_hosts(network, host_ids, chunk_size=400):
+    """
+    Adds hosts to the network. Relations are inserted in chunks of
+    chunk_size rows with bulk_create, if it is available, or saved one by
+    one otherwise, so callers should run it in a transaction (as set_hosts
+    does) to avoid committing every row separately.
+    """
+    for i in xrange(0, len(host_ids), chunk_size):
+        relations = [NetworkHost(network=network, host_id=host_id)
+                     for host_id in host_ids[i:i + chunk_size]]
+        if hasattr(NetworkHost.objects, 'bulk_create'):
+            NetworkHost.objects.bulk_create(relations)
+        else:
+            for relation in relations:
+                relation.save()
+
 class NetworkHost(models.Model):
     """
     Since one cannot use ManyToManyField type in GAE [1], we have to
@@ -20,14 +20,81 @@
 
 import os, sys
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + '/../../reportlab.zip'))
+from collections import namedtuple
+from cStringIO import StringIO
 
+from django.conf import settings
+from django.db.models import Q
 from reportlab.lib.units import cm
 from geraldo import Report, SubReport, ReportBand, ObjectValue, \
     SystemField, Label, BAND_WIDTH
+from geraldo.generators import PDFGenerator
 from reportlab.lib.enums import TA_CENTER
 
+
+# single row of the report; rows are built from plain values instead
+# of Event instances, so rendering doesn't need any additional queries
+ReportRow = namedtuple('ReportRow', 'timestamp message event_type source_host')
+
+REPORT_ROW_FIELDS = ('timestamp', 'message', 'event_type__name',
+                     'source_host__name')
+
+# number of rows fetched from the database with a single query
+REPORT_ROWS_CHUNK_SIZE = getattr(settings, 'REPORT_ROWS_CHUNK_SIZE', 1000)
+
+
+
+def format_timestamp(timestamp):
+    return timestamp.strftime('%m-%d-%Y %H:%M')
+
+
+def iter_report_rows(events, chunk_size=REPORT_ROWS_CHUNK_SIZE):
+    """
+    Yields ReportRow objects for the given events queryset, ordered by
+    timestamp. Values are fetched with joined queries in chunks of
+    chunk_size rows, each one starting after the (timestamp, pk) of the
+    previous chunk's last row, so model instances are not created and
+    only one chunk is kept in memory.
+    """
+    events = events.order_by('timestamp', 'pk')
+    fields = REPORT_ROW_FIELDS + ('pk', )
+    chunk = events
+    while True:
+        rows = list(chunk.values_list(*fields)[:chunk_size])
+        for row in rows:
+            yield ReportRow(*row[:-1])
+        if len(rows) < chunk_size:
+            break
+        timestamp, pk = rows[-1][0], rows[-1][-1]
+        chunk = events.filter(Q(timestamp__gt=timestamp) |
+                              Q(timestamp=timestamp, pk__gt=pk))
+
+
+def report_rows(events):
+    """Returns list of ReportRow objects for the given events queryset"""
+    return list(iter_report_rows(events))
+
+
+def render_pdf(report_class, title, rows):
+    """
+    Returns content of the PDF report with the given rows. It doesn't use
+    the database, so it may be called in a separate process.
+    """
+    report = report_class(title, queryset=rows)
+    output = StringIO()
+    report.generate_by(PDFGenerator, filename=output)
+    return output.getvalue()
+
+
 class HostReport(Report):
     title = 'Host report'
+    # (label, attribute, formatter) for every column of the report, used
+    # by renderers other than PDF
+    columns = (
+        ('Timestamp', 'timestamp', format_timestamp),
+        ('Message', 'message', None),
+        ('Event type', 'event_type', None),
+    )
     margin_left = margin_top = margin_right = margin_bottom = 2*cm
     print_if_empty = True
     
@@ -63,7 +130,7 @@ class HostReport(Report):
         height=2*cm
         elements=[
             ObjectValue(attribute_name='timestamp', top=0, left=0*cm, width=3*cm,
-                get_value=lambda instance: instance.timestamp.strftime('%m-%d-%Y %H:%M')),
+                get_value=lambda instance: format_timestamp(instance.timestamp)),
             ObjectValue(attribute_name='message', top=0, left=3*cm, width=11*cm),
             ObjectValue(attribute_name='event_type', top=0, left=14.5*cm),
         ]
@@ -71,6 +138,9 @@ class HostReport(Report):
         
 class NetworkReport(Report):
     title = 'Network report'
+    columns = HostReport.columns + (
+        ('Source host', 'source_host', None),
+    )
     margin_left = margin_top = margin_right = margin_bottom = 2*cm
     print_if_empty = True
     
@@ -108,11 +178,10 @@ class NetworkReport(Report):
         height=2.5*cm
         elements=[
             ObjectValue(attribute_name='timestamp', top=0, left=0*cm, width=3*cm,
-                get_value=lambda instance: instance.timestamp.strftime('%m-%d-%Y %H:%M')),
+                get_value=lambda instance: format_timestamp(instance.timestamp)),
             ObjectValue(attribute_name='message', top=0, left=3*cm, width=8*cm),
             ObjectValue(attribute_name='event_type', top=0, left=12*cm, width=1.5*cm),
-            ObjectValue(attribute_name='source_host', top=0, left=14*cm,
-                get_value=lambda instance: instance.source_host.name),
+            ObjectValue(attribute_name='source_host', top=0, left=14*cm),
         ]
         borders = {'bottom': True}
     
\ No newline at end of file
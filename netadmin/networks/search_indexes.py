@@ -30,21 +30,45 @@ try:
     search.register(Network, ('name', 'description'),
                     indexer=startswith)
 except ImportError:
+    from django.db.models import signals
     from haystack import indexes
     from haystack import site
+    from netadmin.permissions.models import ObjectPermission
+    from netadmin.permissions.utils import sharing_user_ids
 
-    class HostIndex(indexes.SearchIndex):
+    class SharedObjectIndex(indexes.RealTimeSearchIndex):
         text = indexes.CharField(document=True, use_template=True)
+        # ids of the owner and users sharing the object; search results
+        # are filtered by this field in the search engine
+        users = indexes.MultiValueField()
+
+        def prepare_users(self, obj):
+            return sharing_user_ids(obj)
+
+    class HostIndex(SharedObjectIndex):
 
         def index_queryset(self):
             return Host.objects.all()
 
-    class NetworkIndex(indexes.SearchIndex):
-        text = indexes.CharField(document=True, use_template=True)
+    class NetworkIndex(SharedObjectIndex):
 
         def index_queryset(self):
             return Network.objects.all()
 
     site.register(Network, NetworkIndex)
     site.register(Host, HostIndex)
+
+    def update_shared_object(sender, instance, **kwargs):
+        """Reindexes host or network when a permission on it changes"""
+        model = instance.content_type.model_class()
+        if model not in (Host, Network):
+            return
+        try:
+            obj = model.objects.get(pk=instance.object_id)
+        except model.DoesNotExist:
+            return
+        site.get_index(model).update_object(obj)
+
+    signals.post_save.connect(update_shared_object, sender=ObjectPermission)
+    signals.post_delete.connect(update_shared_object, sender=ObjectPermission)
     
\ No newline at end of file
@@ -25,6 +25,7 @@ import unittest
 from netaddr import *
 
 from models import Host, Network, NetworkHost
+from utils import get_subnet, address_lookup
 from netadmin.permissions.utils import user_has_access, user_can_edit, \
     grant_access, revoke_access, revoke_edit
 from netadmin.utils.testutils import EventBaseTest, HostBaseTest, \
@@ -108,6 +109,10 @@ class HostTest(HostBaseTest, EventBaseTest):
         self.assertItemsEqual(self.host.fields(), [u'a', u'b', u'c'])
         self.assertItemsEqual(other_host.fields(), [u'd'])
 
+        # names longer than the catalog column are truncated
+        self.create_event(other_host, et, fields_data={'e' * 150: 5})
+        self.assertItemsEqual(other_host.fields(), [u'd', u'e' * 100])
+
     def test_object_detail(self):
         """
         The context on the host detail page should contain the following
@@ -197,6 +202,24 @@ class HostTest(HostBaseTest, EventBaseTest):
         self.assertEqual(host.name, host_data['name'])
         self.assertEqual(host.description, host_data['description'])
 
+    def test_address_lookup(self):
+        """
+        Hosts should be found by numeric addresses, regardless
+        of the notation
+        """
+        self.assertEqual(self.host.ipv4_int, 0x01020304)
+        host = self.create_host(self.user, "Host 6", '1.2.3.5', '2001:db8::1')
+        lookup = address_lookup(ipv6='2001:0db8:0:0::0001')
+        self.assertEqual(Host.objects.get(lookup), host)
+        lookup = address_lookup(ipv4='1.2.3.4')
+        self.assertEqual(Host.objects.get(lookup), self.host)
+
+        # hosts without numeric addresses are matched by strings
+        Host.objects.filter(pk=host.pk).update(ipv4_int=None, ipv6_hex=None)
+        lookup = address_lookup(ipv4='1.2.3.5', ipv6='2001:db8::1')
+        self.assertEqual(Host.objects.get(lookup), host)
+
+
 class NetworkTest(NetworkBaseTest, HostBaseTest):
     """Tests for Network and NetworkHost models
     """
@@ -242,6 +265,58 @@ class NetworkTest(NetworkBaseTest, HostBaseTest):
         self.assertEqual(self.network.has_host(self.host_a), True)
         self.assertEqual(self.network.has_host(self.host_b), True)
 
+    def test_hosts_and_networks(self):
+        """
+        The hosts() and networks() methods should return objects on both
+        sides of the relation
+        """
+        self.network.add_host(self.host_a)
+        self.assertEqual(list(self.network.hosts()), [self.host_a])
+        self.assertEqual(list(self.host_a.networks()), [self.network])
+        self.assertEqual(list(self.host_b.networks()), [])
+
+        # duplicated relations shouldn't duplicate results
+        NetworkHost.objects.create(network=self.network, host=self.host_a)
+        self.assertEqual(list(self.network.hosts()), [self.host_a])
+        self.assertEqual(list(self.host_a.networks()), [self.network])
+
+    def test_set_hosts(self):
+        """
+        The set_hosts() method should add and remove only changed relations
+        """
+        self.network.add_host(self.host_a)
+        relation = NetworkHost.objects.get(network=self.network,
+                                           host=self.host_a)
+
+        self.assertEqual(self.network.set_hosts([self.host_a, self.host_b]),
+                         (1, 0))
+        self.assertEqual(self.network.hosts().count(), 2)
+        self.assertEqual(NetworkHost.objects.get(network=self.network,
+                                                 host=self.host_a), relation)
+
+        self.assertEqual(self.network.set_hosts([str(self.host_b.pk)]),
+                         (0, 1))
+        self.assertEqual(list(self.network.hosts()), [self.host_b])
+
+        # invalid values and keys of missing hosts are skipped
+        self.assertEqual(self.network.set_hosts(['', 'abc', None, -1,
+            str(self.host_a.pk), self.host_b]), (1, 0))
+        self.assertEqual(self.network.hosts().count(), 2)
+
+    def test_get_subnet(self):
+        """Hosts should be matched by range of their numeric addresses
+        """
+        host_c = self.create_host(self.user, "Host C", "10.1.2.3",
+                                  "2001:db8::1")
+        hosts = Host.objects.filter(user=self.user)
+        self.assertItemsEqual(get_subnet(hosts, '8', '1.0.0.0'),
+                              [self.host_a, self.host_b])
+        self.assertEqual(list(get_subnet(hosts, '32', '1.0.0.2')),
+                         [self.host_b])
+        self.assertEqual(list(get_subnet(hosts, '32', '2001:db8::')),
+                         [host_c])
+        self.assertEqual(list(get_subnet(hosts, '16', '192.168.0.0')), [])
+
     def test_remove_host(self):
         """
         The remove_host() method should remove relation between host
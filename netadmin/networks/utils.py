@@ -20,6 +20,7 @@
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.db.models import Q
 from netaddr import *
 
 def IPv6_validation(value):
@@ -38,21 +39,66 @@ def IPv4_validation(value):
     except ValueError:
         raise ValidationError(u'%s is not a correct IPv4 address' % value)
 
-def get_subnet(host_list,sub,add):
-    subnet_ip = []
-    render_hosts = []
-    find_host = []
-    subnet_ip  = [add,sub]
-    subnet_ip = "/".join(subnet_ip)
-    ip = IPNetwork(subnet_ip)
-    for x in ip:
-        render_hosts.append(str(x))
-    for user_host in host_list:
-        for render_host in render_hosts:
-            if user_host.ipv4 == render_host or user_host.ipv6 == render_host:
-                find_host.append(user_host)
-    return find_host
-    
-
-
-    
+def ipv4_to_int(value):
+    """Returns IPv4 address as integer or None if it's not valid"""
+    try:
+        address = IPAddress(value)
+    except (ValueError, AddrFormatError, TypeError):
+        return None
+    if address.version != 4:
+        return None
+    return int(address)
+
+def ipv6_to_hex(value):
+    """
+    Returns IPv6 address as 32 hexadecimal digits (or None if it's
+    not valid). Strings of the same length sort in the same order as
+    addresses, so they may be compared in range queries.
+    """
+    try:
+        address = IPAddress(value)
+    except (ValueError, AddrFormatError, TypeError):
+        return None
+    if address.version != 6:
+        return None
+    return '%032x' % int(address)
+
+def address_lookup(ipv4=None, ipv6=None):
+    """
+    Returns Q object selecting hosts with the given addresses. Valid
+    addresses are compared in numeric form, so different notations of the
+    same address match; anything else is compared as a string. Hosts which
+    have no numeric address yet (created before the numeric columns were
+    added, see the update_host_addresses command) are compared as strings.
+    """
+    lookup = Q()
+    if ipv4:
+        number = ipv4_to_int(ipv4)
+        if number is None:
+            lookup &= Q(ipv4=ipv4)
+        else:
+            lookup &= Q(ipv4_int=number) | Q(ipv4_int__isnull=True, ipv4=ipv4)
+    if ipv6:
+        number = ipv6_to_hex(ipv6)
+        if number is None:
+            lookup &= Q(ipv6=ipv6)
+        else:
+            lookup &= Q(ipv6_hex=number) | Q(ipv6_hex__isnull=True, ipv6=ipv6)
+    return lookup
+
+def subnet_lookup(address, prefix):
+    """
+    Returns lookup arguments selecting hosts with addresses in the subnet,
+    e.g. subnet_lookup('10.0.0.0', '8') selects hosts from 10.0.0.0/8
+    """
+    network = IPNetwork('%s/%s' % (address, prefix))
+    if network.version == 4:
+        return {'ipv4_int__gte': network.first,
+                'ipv4_int__lte': network.last}
+    return {'ipv6_hex__gte': '%032x' % network.first,
+            'ipv6_hex__lte': '%032x' % network.last}
+
+def get_subnet(host_list, sub, add):
+    """Returns hosts from the queryset which belong to the subnet add/sub
+    """
+    return host_list.filter(**subnet_lookup(add, sub))
@@ -32,13 +32,12 @@ try:
 except ImportError:
     search = None
 
-from netadmin.events.models import Event
 from netadmin.shortcuts import get_timezone, get_netmask
 from netadmin.permissions.utils import filter_user_objects, \
     get_object_or_forbidden, grant_access, grant_edit, revoke_access, \
-    revoke_edit, user_has_access
+    revoke_edit, user_has_access, user_object_ids
 
-from models import Host, Network, NetworkHost
+from models import Host, Network
 from forms import HostCreateForm, HostUpdateForm, NetworkCreateForm, \
     NetworkUpdateForm, SubnetCreateFrom
 from utils import get_subnet
@@ -49,10 +48,11 @@ def host_list(request, page=None):
     search_phrase = request.GET.get('s')
     if search_phrase and search != None:
         hosts = search(Host, search_phrase)
+        hosts = hosts.filter(pk__in=user_object_ids(request.user, Host))
     else:
         hosts = Host.shared_objects(request.user)
         
-    paginator = Paginator(list(hosts), 10)
+    paginator = Paginator(hosts, 10)
     
     page = page or request.GET.get('page', 1)
     try:
@@ -125,12 +125,11 @@ def network_list(request, page=None):
     search_phrase = request.GET.get('s')
     if search_phrase and search != None:
         nets = search(Network, search_phrase)
-        # TODO
-        # filter search results by user access
+        nets = nets.filter(pk__in=user_object_ids(request.user, Network))
     else:
         nets = Network.shared_objects(request.user)
         
-    paginator = Paginator(list(nets), 10)
+    paginator = Paginator(nets, 10)
     
     page = page or request.GET.get('page', 1)
     try:
@@ -195,10 +194,8 @@ def network_events(request, object_id):
         return Http404()
 
     queryset = Network.shared_objects(request.user)
-    related_hosts = [nh.host.pk for nh in NetworkHost.objects.filter(network=network)]
-    events = Event.objects.filter(source_host__pk__in=related_hosts)
     extra_context = {
-        'events': events,
+        'events': network.events(),
         'can_edit': network.can_edit(request.user)
     }
     return object_detail(request, queryset, object_id,
@@ -260,10 +257,7 @@ def subnet_network(request):
             user_host = get_hosts(user=request.user)
             hosts_list = get_subnet(user_host, subnet,ip)
             subnet_network = form.save()
-            network_obj = Network.objects.get(name__exact = form.cleaned_data['name'])
-            for hosts in hosts_list:
-                network_entry = NetworkHost(network_id = network_obj.id, host_id = hosts.id)
-                network_entry.save()
+            subnet_network.set_hosts(hosts_list)
             extra_context = {
                 'form': SubnetCreateFrom(initial={'user': request.user.pk}),
                 'host_list': hosts_list
@@ -279,14 +273,8 @@ def subnet_network(request):
 @login_required
 def network_detail(request, object_id):
     network_obj = Network.objects.get(id = object_id)
-    host_list = []
     if network_obj.subnet:
-        hosts = NetworkHost.objects.filter(network = object_id)
-        host_id = hosts.values('host')
-        for h_id in host_id:
-            for key,value in h_id.items():
-                host_obj = Host.objects.get(pk= value)
-                host_list.append(host_obj)
+        host_list = network_obj.hosts()
     else:
         host_list = Host.objects.filter(user=request.user)
     extra_context = {
@@ -299,8 +287,6 @@ def network_detail(request, object_id):
 def network_select(request,object_id):
     if request.method == 'POST':
         host = request.POST.getlist('host')
-        NetworkHost.objects.filter(network = object_id).delete()
-        for hosts in host:
-            network_entry = NetworkHost(network_id = object_id, host_id = hosts.replace("/",""))
-            network_entry.save()
+        network = Network.objects.get(pk=object_id)
+        network.set_hosts([hosts.replace("/","") for hosts in host])
     return HttpResponseRedirect('../.././../list')
@@ -18,4 +18,4 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from netadmin.notifier.utils import dispatcher, manager
+from netadmin.notifier.utils import dispatcher, manager, registry
@@ -20,7 +20,12 @@
 
 import itertools
 
+from django.contrib.auth.models import SiteProfileNotAvailable
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.mail import get_connection
 from django.core.mail.message import EmailMultiAlternatives
+from django.db.models import Q
 from django.utils.translation import ugettext as _
 from Skype4Py import Skype
 
@@ -35,16 +40,39 @@ class UnknownEMailAddress(Exception):
     pass
 
 
+def repeated_message(notification):
+    return _("Repeated %(count)i times between %(first)s and %(last)s.") % {
+        'count': notification.count,
+        'first': notification.created,
+        'last': notification.last_occurrence
+    }
+
+
 class BaseBackend(object):
     """Base class of notifications backend
     """
     __identifier__ = 'base'
 
-    def send(self, queryset):
+    def accepts(self, notification):
+        """
+        Returns False if the back-end can never deliver the notification
+        (e.g. the user has no address it needs)
+        """
+        return True
+
+    def deliverable(self):
+        """
+        Returns Q object selecting notifications the back-end can deliver
+        or None if it can deliver all of them
+        """
+        return None
+
+    def send(self, notifications):
         """
-        Iterates over the notifications queryset and sends every notification
+        Sends every notification from the list and returns list of those
+        notifications that were delivered
         """
-        pass
+        return []
 
 
 class EMailBackend(BaseBackend):
@@ -56,76 +84,120 @@ class EMailBackend(BaseBackend):
     
     def __init__(self, from_address=NOTIFICATION_BACKEND_EMAIL_FROM):
         self.from_address = from_address
+        self.connection = None
+
+    def accepts(self, notification):
+        return bool(notification.user.email)
+
+    def deliverable(self):
+        return Q(user__email__gt='')
 
     def to_text(self, notification):
         underline = '=' * len(notification.title)
-        return '%s\n%s\n%s' % \
+        text = '%s\n%s\n%s' % \
                (notification.title, underline, notification.content)
+        if notification.is_repeated():
+            text = '%s\n\n%s' % (text, repeated_message(notification))
+        return text
 
     def to_html(self, notification):
-        return '<h2>%s</h2><p>%s</p>' % \
+        html = '<h2>%s</h2><p>%s</p>' % \
                (notification.title, notification.content)
+        if notification.is_repeated():
+            html = '%s<p><em>%s</em></p>' % \
+                   (html, repeated_message(notification))
+        return html
+
+    def create_email(self, to_address, notifications):
+        """Returns single message containing all given notifications
+        """
+        text_message = self.text_separator.join(
+            [self.to_text(notification) for notification in notifications])
+        html_message = self.html_separator.join(
+            [self.to_html(notification) for notification in notifications])
+        email = EmailMultiAlternatives(self.subject, text_message,
+                                       self.from_address, [to_address])
+        email.attach_alternative(html_message, "text/html")
+        for notification in notifications:
+            attachment = self.get_attachment(notification)
+            if attachment:
+                email.attach(*attachment)
+        return email
+
+    def get_attachment(self, notification):
+        """
+        Returns attachment provided by the object related to notification
+        (the object has to define get_attachment() method)
+        """
+        if not notification.related_type_id:
+            return None
+        content_type = ContentType.objects.get_for_id(notification.related_type_id)
+        if not hasattr(content_type.model_class(), 'get_attachment'):
+            return None
+        related_object = notification.related_object
+        if not related_object:
+            return None
+        return related_object.get_attachment()
+
+    def send(self, notifications):
+        """
+        Groups notifications by user and sends one message per user.
+        All messages are sent through a single SMTP connection. Users
+        without e-mail address are skipped, so their notifications are
+        not delivered.
+        """
+        if not hasattr(notifications, '__iter__'):
+            notifications = [notifications]
+        notifications = sorted(notifications, key=lambda notif: notif.user_id)
+
+        emails, delivered = [], []
+        for user_id, group in itertools.groupby(notifications,
+                                                lambda notif: notif.user_id):
+            group = list(group)
+            to_address = group[0].user.email
+            if not to_address:
+                continue
+            emails.append(self.create_email(to_address, group))
+            delivered.extend(group)
+
+        if emails:
+            if not self.connection:
+                self.connection = get_connection()
+            self.connection.send_messages(emails)
+
+        return delivered
 
-    def send(self, queryset):
-        try:
-            queryset = queryset.order_by('user_id')
-        except AttributeError:
-            notification = queryset
-
-            text_msg = self.to_text(notification)
-            html_msg = self.to_html(notification)
-            to_address = notification.user.email
-            email = EmailMultiAlternatives(self.subject, text_msg,
-                                           self.from_address, [to_address])
-            email.attach_alternative(html_msg, "text/html")
-            email.send()
-            
-            return email
-
-        emails = []
-        for key, group in itertools.groupby(queryset.order_by('user_id'),
-                                            lambda notif: notif.user.email):
-            if not key:
-                raise UnknownEMailAddress()
-
-            html_messages, text_messages = [], []
-            for notification in group:
-                html_messages.append(self.to_html(notification))
-                text_messages.append(self.to_text(notification))
-            text_message = self.text_separator.join(text_messages)
-            html_message = self.html_separator.join(html_messages)
-
-            to_address = key
-
-            email = EmailMultiAlternatives(self.subject, text_message,
-                                           self.from_address, [to_address])
-            email.attach_alternative(html_message, "text/html")
-            emails.append(email)
-
-        for email in emails:
-            email.send()
-
-        return emails
 
 class SkypeBackend(BaseBackend):
-	__identifier__ = 'skype'
-	
-	Title = "Notifications from the Network Administrator"
-	
-	def to_text(slef, notification):
-		underline = '=' * len(notification.title)
-		return '%s\n%s\n%s' % \
-				(notification.title, underline, notification.content)
-		
-	def send(self, queryset):
-		try:
-			queryset = queryset.order_by('user_id')
-		except AttributeError:
-			notification = queryset
-        
-		test_message = self.to_text(notification)
-		test_user = slef.to_user(notification.user.skype)
-		client = Skype(Transport='x11')
-		client.Attach()
-		client.SendMessage(test_user,test_message)
-		return test_user
+    __identifier__ = 'skype'
+
+    def accepts(self, notification):
+        try:
+            return bool(notification.user.get_profile().skype)
+        except (ObjectDoesNotExist, SiteProfileNotAvailable):
+            return False
+
+    def deliverable(self):
+        return Q(user__userprofile__skype__gt='')
+
+    def to_text(self, notification):
+        underline = '=' * len(notification.title)
+        return '%s\n%s\n%s' % \
+               (notification.title, underline, notification.content)
+
+    def send(self, notifications):
+        if not hasattr(notifications, '__iter__'):
+            notifications = [notifications]
+
+        client = None
+        delivered = []
+        for notification in notifications:
+            if not self.accepts(notification):
+                continue
+            skype_user = notification.user.get_profile().skype
+            if not client:
+                client = Skype(Transport='x11')
+                client.Attach()
+            client.SendMessage(skype_user, self.to_text(notification))
+            delivered.append(notification)
+        return delivered
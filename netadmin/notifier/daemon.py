@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Long-running notifications dispatcher. Instead of being started by cron
+every few minutes, the daemon stays resident and polls the notifications
+queue. The polling interval adapts to the traffic: it drops to the minimum
+as soon as there is something to send and grows exponentially (up to the
+maximum) while the queue stays empty.
+"""
+
+import threading
+
+from django import db
+from django.conf import settings
+from django.db import transaction
+
+
+NOTIFIER_MIN_INTERVAL = getattr(settings, 'NOTIFIER_MIN_INTERVAL', 1)
+NOTIFIER_MAX_INTERVAL = getattr(settings, 'NOTIFIER_MAX_INTERVAL', 10)
+
+
+class NotifierDaemon(object):
+    """Dispatches notifications in a loop until stopped
+    """
+    def __init__(self, dispatcher, min_interval=NOTIFIER_MIN_INTERVAL,
+                 max_interval=NOTIFIER_MAX_INTERVAL, callback=None):
+        self.dispatcher = dispatcher
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.interval = min_interval
+        self.callback = callback
+        self._stop = threading.Event()
+
+    @property
+    def stats(self):
+        return self.dispatcher.stats
+
+    def run_once(self):
+        """
+        Runs single dispatch cycle and returns the number of delivered
+        notifications
+        """
+        delivered = 0
+        if self.dispatcher.manager.count():
+            # dispatching also drops notifications that can't be delivered
+            delivered = self.dispatcher.dispatch()
+        # only deliverable notifications keep the interval at the minimum
+        self.stats.queue_depth = self.dispatcher.queue_depth()
+
+        # end the current transaction so the next cycle sees notifications
+        # committed in the meantime, and don't let the query log grow
+        transaction.commit_unless_managed()
+        db.reset_queries()
+        return delivered
+
+    def next_interval(self, delivered):
+        """Computes time to wait before the next cycle
+        """
+        if delivered or self.stats.queue_depth:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return self.interval
+
+    def run(self):
+        """Dispatches notifications until stop() is called
+        """
+        self._stop.clear()
+        while not self._stop.is_set():
+            delivered = self.run_once()
+            if self.callback:
+                self.callback(self, delivered)
+            self._stop.wait(self.next_interval(delivered))
+
+    def stop(self):
+        self._stop.set()
@@ -1,9 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
 # Copyright (C) 2012 Adriano Monteiro Marques
 #
 # Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
@@ -21,17 +18,38 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from optparse import make_option
+
 from django.core.management.base import NoArgsCommand
 from django.utils.translation import ugettext as _
 
 from netadmin.notifier import dispatcher
+from netadmin.notifier.daemon import NotifierDaemon, NOTIFIER_MIN_INTERVAL, \
+    NOTIFIER_MAX_INTERVAL
 
 
 class Command(NoArgsCommand):
 
     help = _(u"Sends all notifications")
 
+    option_list = NoArgsCommand.option_list + (
+        make_option('--daemon', action='store_true', dest='daemon',
+                    default=False,
+                    help=_(u"Keep running and dispatch notifications as "
+                           u"soon as they arrive")),
+        make_option('--min-interval', type='float', dest='min_interval',
+                    default=NOTIFIER_MIN_INTERVAL,
+                    help=_(u"Minimal time (in seconds) between two "
+                           u"dispatch cycles in daemon mode")),
+        make_option('--max-interval', type='float', dest='max_interval',
+                    default=NOTIFIER_MAX_INTERVAL,
+                    help=_(u"Maximal time (in seconds) between two "
+                           u"dispatch cycles in daemon mode")),
+    )
+
     def handle_noargs(self, **options):
+        if options.get('daemon'):
+            return self.run_daemon(**options)
 
         self.stdout.write(_(u"Sending notifications... "))
         self.stdout.flush()
@@ -39,3 +57,22 @@ class Command(NoArgsCommand):
         dispatcher.dispatch()
 
         self.stdout.write(_(u"done.\n"))
+
+    def run_daemon(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        def report(daemon, delivered):
+            if delivered or verbosity > 1:
+                self.stdout.write(u"%s\n" % daemon.stats.__unicode__())
+                self.stdout.flush()
+
+        daemon = NotifierDaemon(dispatcher, options['min_interval'],
+                                options['max_interval'], callback=report)
+
+        self.stdout.write(_(u"Notifier daemon started.\n"))
+        self.stdout.flush()
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            daemon.stop()
+        self.stdout.write(_(u"Notifier daemon stopped.\n"))
@@ -33,7 +33,38 @@ class Notification(models.Model):
     related_type = models.ForeignKey(ContentType, null=True, blank=True)
     related_id = models.PositiveIntegerField(null=True, blank=True)
     
+    created = models.DateTimeField(auto_now_add=True, null=True)
+
+    # notifications with the same key are merged (see
+    # NotificationsManager.coalesce); count is the number of occurrences
+    key = models.CharField(max_length=255, blank=True, default='',
+                           db_index=True)
+    count = models.PositiveIntegerField(default=1)
+    last_occurrence = models.DateTimeField(null=True, blank=True)
+
+    # dispatcher which is sending the notification and time until which
+    # other dispatchers may not take it (see NotificationsManager.claim)
+    claimed_by = models.CharField(max_length=32, blank=True, default='',
+                                  db_index=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    
     related_object = generic.GenericForeignKey('related_type', 'related_id')
 
     def __unicode__(self):
         return self.title
+
+    def is_repeated(self):
+        """Returns True if the notification was merged with other ones"""
+        return self.count > 1
+
+class NotificationRate(models.Model):
+    """
+    Number of notifications created for the user in the current time window
+    (see NotificationsManager.increment_rate)
+    """
+    user = models.ForeignKey(User, unique=True)
+    window_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    def __unicode__(self):
+        return u"%s: %i" % (self.user.username, self.count)
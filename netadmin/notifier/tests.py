@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.core import mail
+
+from netadmin.notifier.backends import BaseBackend
+from netadmin.notifier.daemon import NotifierDaemon
+from netadmin.notifier.models import Notification
+from netadmin.notifier.utils import BackendsRegistry, Dispatcher, \
+    NotificationsManager, UnknownBackend
+from netadmin.networks.models import Host
+from netadmin.utils.testutils import BaseTest, EventBaseTest
+
+
+class DispatcherTest(BaseTest):
+    """Tests for notifications dispatcher
+    """
+    def setUp(self):
+        super(DispatcherTest, self).setUp()
+        self.other_user = self.create_user('other', 'otherpassword')
+        self.manager = NotificationsManager()
+        self.dispatcher = Dispatcher(self.manager)
+
+    def test_dispatch(self):
+        """
+        Notifications should be grouped by user, so every user gets
+        exactly one message; delivered notifications should be deleted
+        """
+        for i in xrange(3):
+            self.manager.add('title %i' % i, 'content', self.user)
+            self.manager.add('title %i' % i, 'content', self.other_user)
+
+        sent = self.dispatcher.dispatch(using_backends=['e-mail'],
+                                        chunk_size=10)
+        self.assertEqual(sent, 6)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(Notification.objects.count(), 0)
+
+    def test_dispatch_chunks(self):
+        """Every chunk of notifications should be sent separately
+        """
+        for i in xrange(5):
+            self.manager.add('title %i' % i, 'content', self.user)
+
+        sent = self.dispatcher.dispatch(using_backends=['e-mail'],
+                                        chunk_size=2)
+        self.assertEqual(sent, 5)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(Notification.objects.count(), 0)
+
+    def test_undelivered_notifications(self):
+        """
+        Notifications that were not delivered should not be deleted,
+        unless no back-end can ever deliver them
+        """
+        self.other_user.email = ''
+        self.other_user.save()
+        self.manager.add('title', 'content', self.user)
+        self.manager.add('title', 'content', self.other_user)
+        self.assertEqual(self.dispatcher.queue_depth(['e-mail']), 1)
+
+        # the notification is kept if it is not going to be deleted
+        self.dispatcher.dispatch(using_backends=['e-mail'], clear=False)
+        self.assertEqual(self.dispatcher.stats.dropped, 0)
+        self.assertEqual(Notification.objects.count(), 2)
+        mail.outbox = []
+
+        # or if a back-end not used in this run may deliver it
+        profile = self.other_user.get_profile()
+        profile.skype = 'other'
+        profile.save()
+        self.dispatcher.dispatch(using_backends=['e-mail'])
+        self.assertEqual(self.dispatcher.stats.dropped, 0)
+        self.assertEqual(Notification.objects.count(), 1)
+        profile.skype = ''
+        profile.save()
+        mail.outbox = []
+
+        self.manager.add('title', 'content', self.user)
+        sent = self.dispatcher.dispatch(using_backends=['e-mail'])
+        self.assertEqual(sent, 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(self.dispatcher.stats.dropped, 1)
+        self.assertEqual(Notification.objects.count(), 0)
+
+        self.dispatcher.registry.register(FailingBackend)
+        undelivered = self.manager.add('title', 'content', self.user)
+        self.assertEqual(self.dispatcher.dispatch(using_backends=['failing']),
+                         0)
+        self.assertEqual(list(Notification.objects.all()), [undelivered])
+
+    def test_stats(self):
+        """Dispatcher should count delivered notifications and latency
+        """
+        self.manager.add('title', 'content', self.user)
+        # notifications created before the creation time was stored
+        old = self.manager.add('title', 'content', self.other_user)
+        Notification.objects.filter(pk=old.pk).update(created=None)
+        self.dispatcher.dispatch(using_backends=['e-mail'])
+        self.assertEqual(self.dispatcher.stats.cycles, 1)
+        self.assertEqual(self.dispatcher.stats.delivered, 2)
+        self.assertEqual(self.dispatcher.stats.timed, 1)
+        self.assertTrue(self.dispatcher.stats.max_latency >= 0)
+
+
+class DummyBackend(BaseBackend):
+    __identifier__ = 'dummy'
+
+    def send(self, notifications):
+        return notifications
+
+
+class FailingBackend(BaseBackend):
+    __identifier__ = 'failing'
+
+    def send(self, notifications):
+        raise IOError("Connection refused")
+
+
+class BackendsRegistryTest(BaseTest):
+    """Tests for notification back-ends registry
+    """
+    def test_register(self):
+        """Registered back-ends should be available by their identifiers
+        """
+        registry = BackendsRegistry()
+        self.assertRaises(UnknownBackend, registry.get, 'dummy')
+        registry.register(DummyBackend)
+        self.assertIn('dummy', registry.identifiers())
+        self.assertIn('e-mail', registry.identifiers())
+        self.assertIsInstance(registry.get('dummy'), DummyBackend)
+
+    def test_instances_reused(self):
+        """Registry should return the same back-end instance every time
+        """
+        registry = BackendsRegistry()
+        self.assertIs(registry.get('e-mail'), registry.get('e-mail'))
+
+
+class NotifierDaemonTest(BaseTest):
+    """Tests for the long-running dispatcher
+    """
+    def setUp(self):
+        super(NotifierDaemonTest, self).setUp()
+        self.manager = NotificationsManager()
+        self.dispatcher = Dispatcher(self.manager)
+        self.daemon = NotifierDaemon(self.dispatcher, min_interval=1,
+                                     max_interval=8)
+
+    def test_run_once(self):
+        """Single cycle should send everything and update queue depth
+        """
+        self.manager.add('title', 'content', self.user)
+        self.assertEqual(self.daemon.run_once(), 1)
+        self.assertEqual(self.daemon.stats.queue_depth, 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_adaptive_interval(self):
+        """
+        Interval should grow while the queue is empty and drop to the
+        minimum as soon as something was delivered
+        """
+        intervals = [self.daemon.next_interval(0) for i in xrange(5)]
+        self.assertEqual(intervals, [2, 4, 8, 8, 8])
+        self.assertEqual(self.daemon.next_interval(1), 1)
+
+
+class NotificationsManagerTest(EventBaseTest):
+    """Tests for coalescing and rate limiting notifications
+    """
+    def setUp(self):
+        super(NotificationsManagerTest, self).setUp()
+        self.host = Host.objects.create(name='Host', ipv4='1.2.3.4',
+                                        user=self.user)
+        self.event_type = self.create_eventtype('CRITICAL')
+
+    def test_coalesce(self):
+        """
+        Notifications about events of the same type from the same host
+        should be merged into one notification
+        """
+        manager = NotificationsManager(window=60, rate_limit=0)
+        other_type = self.create_eventtype('INFO')
+        for i in xrange(3):
+            event = self.create_event(self.host, self.event_type)
+            manager.add('title', 'content', self.user, event)
+        event = self.create_event(self.host, other_type)
+        manager.add('title', 'content', self.user, event)
+
+        self.assertEqual(Notification.objects.count(), 2)
+        notification = Notification.objects.get(key=event.get_notification_key())
+        self.assertEqual(notification.count, 1)
+        notification = Notification.objects.exclude(pk=notification.pk)[0]
+        self.assertEqual(notification.count, 3)
+        self.assertTrue(notification.is_repeated())
+
+    def test_rate_limit(self):
+        """
+        After exceeding the limit, user should get one warning and no
+        more notifications
+        """
+        manager = NotificationsManager(window=60, rate_limit=2)
+        for i in xrange(5):
+            manager.add('title %i' % i, 'content', self.user)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_claim(self):
+        """
+        Notifications claimed by one dispatcher should not be available
+        to others and should be deleted only by their owner
+        """
+        manager = NotificationsManager()
+        for i in xrange(4):
+            manager.add('title %i' % i, 'content', self.user)
+
+        first = manager.claim('first', 2)
+        second = manager.claim('second', 10)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 2)
+        self.assertFalse(set(first) & set(second))
+
+        # notification added in the meantime must not be removed
+        new = manager.add('new', 'content', self.user)
+        manager.remove('second', [n.pk for n in first + second + [new]])
+        self.assertItemsEqual(Notification.objects.all(), first + [new])
+
+        manager.release('first', [n.pk for n in first])
+        self.assertEqual(len(manager.claim('third', 10)), 3)
@@ -18,10 +18,44 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import datetime
 import inspect
+import logging
+import uuid
+try:
+    from multiprocessing.pool import ThreadPool
+except ImportError:
+    # threads are not available on every platform (e.g. Google AppEngine)
+    ThreadPool = None
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils.datastructures import SortedDict
+from django.utils.importlib import import_module
+from django.utils.translation import ugettext as _
 
 from netadmin.notifier.backends import BaseBackend
-from netadmin.notifier.models import Notification
+from netadmin.notifier.models import Notification, NotificationRate
+
+
+# dotted paths of additional back-end classes
+NOTIFIER_BACKENDS = getattr(settings, 'NOTIFIER_BACKENDS', ())
+
+# maximum number of notifications passed to back-ends at once
+NOTIFIER_CHUNK_SIZE = getattr(settings, 'NOTIFIER_CHUNK_SIZE', 100)
+
+# time (in seconds) for which a dispatcher owns claimed notifications
+NOTIFIER_CLAIM_LEASE = getattr(settings, 'NOTIFIER_CLAIM_LEASE', 300)
+
+# period of time (in seconds) in which notifications with the same key
+# are merged; it is also the period for the per-user rate limit
+NOTIFIER_COALESCE_WINDOW = getattr(settings, 'NOTIFIER_COALESCE_WINDOW', 300)
+
+# maximum number of notifications created for one user within the window
+# (0 means no limit)
+NOTIFIER_USER_RATE_LIMIT = getattr(settings, 'NOTIFIER_USER_RATE_LIMIT', 100)
+
+logger = logging.getLogger(__name__)
 
 
 class BackendError(Exception):
@@ -33,93 +67,398 @@ class NoBackendsAvailable(BackendError):
 class UnknownBackend(BackendError):
     pass
 
-class NotificationBufferEmpty(Exception):
-    pass
 
+class DispatcherStats(object):
+    """
+    Counters describing dispatcher's work. Latency is the time (in seconds)
+    between creating a notification and delivering it.
+    """
+    def __init__(self):
+        self.cycles = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.queue_depth = 0
+        self.timed = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
 
-class Dispatcher(object):
-    _backends = []
+    def add_latency(self, latency):
+        """
+        Records latency of a delivered notification (notifications created
+        before the creation time was stored have no latency)
+        """
+        self.timed += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+
+    def average_latency(self):
+        if not self.timed:
+            return 0.0
+        return self.total_latency / self.timed
+
+    def __unicode__(self):
+        return "cycles: %i, queue: %i, delivered: %i, dropped: %i, " \
+               "latency: %.2fs last, %.2fs avg, %.2fs max" % \
+               (self.cycles, self.queue_depth, self.delivered, self.dropped,
+                self.last_latency, self.average_latency(), self.max_latency)
 
-    def __init__(self, manager):
-        self.manager = manager
 
-    def _get_backends(self):
+class BackendsRegistry(object):
+    """
+    Keeps notification back-ends known to the dispatcher. The registry
+    is populated once, on first use, with back-ends defined in the
+    netadmin.notifier.backends module, back-ends listed in the
+    NOTIFIER_BACKENDS setting and back-ends provided by active plugins.
+    Other back-ends may be added at any time with register().
+
+    Back-end instances are created on demand and then reused, so
+    back-ends that hold connections don't have to open them again
+    in every dispatch cycle.
+    """
+    def __init__(self):
+        self._classes = SortedDict()
+        self._instances = {}
+        self._populated = False
+
+    def _discover(self):
         from netadmin.notifier import backends
-        backends_list = []
-        for obj_name, obj in inspect.getmembers(backends):
-            if hasattr(obj, '__bases__') and BaseBackend in obj.__bases__:
-                backends_list.append(obj)
-        return backends_list
+        for obj_name, obj in inspect.getmembers(backends, inspect.isclass):
+            if issubclass(obj, BaseBackend) and obj is not BaseBackend:
+                yield obj
+
+        for path in NOTIFIER_BACKENDS:
+            module_name, class_name = path.rsplit('.', 1)
+            yield getattr(import_module(module_name), class_name)
+
+        from netadmin.plugins.core import load_plugins
+        for plugin in load_plugins(active=True):
+            for backend in plugin.notification_backends():
+                yield backend
 
-    def _refresh_backends(self):
-        self._backends = self._get_backends()
+    def populate(self):
+        if self._populated:
+            return
+        self._populated = True
+        for backend in self._discover():
+            self.register(backend)
+
+    def register(self, backend):
+        """Adds back-end class to the registry
+        """
+        self._classes[backend.__identifier__] = backend
+        self._instances.pop(backend.__identifier__, None)
+
+    def unregister(self, identifier):
+        self._classes.pop(identifier, None)
+        self._instances.pop(identifier, None)
+
+    def get_class(self, identifier):
+        self.populate()
+        try:
+            return self._classes[identifier]
+        except KeyError:
+            raise UnknownBackend("Unknown backend: %s" % identifier)
+
+    def get(self, identifier):
+        """Returns instance of the back-end with given identifier
+        """
+        backend_class = self.get_class(identifier)
+        if identifier not in self._instances:
+            self._instances[identifier] = backend_class()
+        return self._instances[identifier]
+
+    def identifiers(self):
+        self.populate()
+        return self._classes.keys()
+
+
+class Dispatcher(object):
+
+    def __init__(self, manager, registry=None):
+        self.manager = manager
+        self.registry = registry or BackendsRegistry()
+        self.stats = DispatcherStats()
 
     def get_backend(self, identifier):
-        self._refresh_backends()
-        for backend in self._backends:
-            if backend.__identifier__ == identifier:
-                return backend()
-        raise UnknownBackend("Unknown backend: %s" % identifier)
+        return self.registry.get(identifier)
 
     def iter_backends(self):
         """Iterates over all available notification back-ends
         """
-        self._refresh_backends()
+        identifiers = self.registry.identifiers()
 
-        if not self._backends:
+        if not identifiers:
             raise NoBackendsAvailable()
 
-        for backend in self._backends:
-            yield backend()
+        for identifier in identifiers:
+            yield self.registry.get(identifier)
+
+    def dispatch(self, using_backends=None, clear=True,
+                 chunk_size=NOTIFIER_CHUNK_SIZE):
+        """
+        Sends all notifications using available back-ends and returns
+        the number of notifications that were delivered.
 
-    def dispatch(self, using_backends=None, clear=True):
-        """Sends all notifications using available back-ends
+        Notifications are processed in chunks of at most chunk_size
+        elements. Every chunk is claimed by this dispatch run before
+        sending, so other dispatchers running at the same time never
+        get the same notifications. The chunk is handed to all back-ends
+        at once, each back-end working in its own thread. If clear is
+        True, only those notifications that were delivered by at least
+        one back-end are deleted; the rest is released and waits for
+        the next dispatch.
         """
-        notifications = self.manager.get_all()
-        
         if using_backends:
             backends = [self.get_backend(id) for id in using_backends]
         else:
-            backends = self.iter_backends()
+            backends = list(self.iter_backends())
+        # notifications are dropped only if no registered back-end,
+        # including those not used in this run, can deliver them
+        all_backends = clear and list(self.iter_backends())
+
+        pool = None
+        if ThreadPool and len(backends) > 1:
+            pool = ThreadPool(len(backends))
+
+        owner = uuid.uuid4().hex
+        delivered_count = 0
+        last_pk = 0
+        try:
+            while True:
+                chunk = self.manager.claim(owner, chunk_size, last_pk)
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+
+                if clear:
+                    chunk = self._drop_undeliverable(owner, all_backends,
+                                                     chunk)
+                    if not chunk:
+                        continue
+                delivered = self._send_chunk(backends, chunk, pool)
+                if clear:
+                    self.manager.remove(owner, delivered)
+                undelivered = [notification.pk for notification in chunk
+                               if not clear or notification.pk not in delivered]
+                self.manager.release(owner, undelivered)
+                delivered_count += len(delivered)
+                self._update_stats(chunk, delivered)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        self.stats.cycles += 1
+        return delivered_count
 
+    def queue_depth(self, using_backends=None):
+        """
+        Returns number of notifications waiting to be sent which can be
+        delivered by at least one back-end
+        """
+        if using_backends:
+            backends = [self.get_backend(id) for id in using_backends]
+        else:
+            backends = list(self.iter_backends())
+        deliverable = None
         for backend in backends:
-            backend.send(notifications)
+            query = backend.deliverable()
+            if query is None:
+                return self.manager.count()
+            deliverable = query if deliverable is None else deliverable | query
+        return self.manager.get_all().filter(deliverable).count()
 
-        if clear:
-            self.manager.clear()
+    def _drop_undeliverable(self, owner, backends, chunk):
+        """
+        Deletes notifications which none of the given back-ends accepts
+        (e.g. for users without e-mail address), so they don't wait in
+        the queue forever; returns the remaining part of the chunk
+        """
+        dropped = [notification.pk for notification in chunk
+                   if not [backend for backend in backends
+                           if backend.accepts(notification)]]
+        if not dropped:
+            return chunk
+        logger.warning("Dropping %i notifications which cannot be delivered"
+                       % len(dropped))
+        self.manager.remove(owner, dropped)
+        self.stats.dropped += len(dropped)
+        return [notification for notification in chunk
+                if notification.pk not in dropped]
+
+    def _update_stats(self, chunk, delivered):
+        self.stats.delivered += len(delivered)
+        now = datetime.datetime.now()
+        for notification in chunk:
+            if notification.pk in delivered and notification.created:
+                latency = now - notification.created
+                self.stats.add_latency(latency.days * 86400 +
+                                       latency.seconds +
+                                       latency.microseconds / 1e6)
+
+    def _send_chunk(self, backends, chunk, pool=None):
+        """
+        Passes chunk of notifications to every back-end and returns set
+        of primary keys of notifications that were delivered
+        """
+        results = []
+        if pool:
+            results = [pool.apply_async(backend.send, (chunk, ))
+                       for backend in backends]
+
+        delivered = set()
+        for i, backend in enumerate(backends):
+            try:
+                if results:
+                    sent = results[i].get()
+                else:
+                    sent = backend.send(chunk)
+            except Exception:
+                logger.exception("Back-end '%s' failed to send notifications"
+                                 % backend.__identifier__)
+                continue
+            delivered.update(notification.pk for notification in sent)
+        return delivered
 
 
 class NotificationsManager(object):
-    _buffer = []
+
+    def __init__(self, window=NOTIFIER_COALESCE_WINDOW,
+                 rate_limit=NOTIFIER_USER_RATE_LIMIT,
+                 lease=NOTIFIER_CLAIM_LEASE):
+        self.window = datetime.timedelta(seconds=window)
+        self.rate_limit = rate_limit
+        self.lease = datetime.timedelta(seconds=lease)
 
     def get_all(self):
         """Returns all notifications
         """
-        self._buffer = Notification.objects.all()
-        return self._buffer
+        return Notification.objects.all()
+
+    def count(self):
+        """Returns number of notifications waiting to be sent
+        """
+        return Notification.objects.count()
 
-    def create(self, title, content, user, related_object=None):
+    def get_available(self, now=None):
+        """Returns notifications which are not claimed by any dispatcher
+        """
+        now = now or datetime.datetime.now()
+        return Notification.objects.filter(Q(claimed_by='') |
+                                           Q(claimed_until__lt=now))
+
+    def claim(self, owner, size=NOTIFIER_CHUNK_SIZE, after_pk=0):
+        """
+        Claims at most size available notifications for the owner and
+        returns list of them, ordered by primary key and starting after
+        the notification with after_pk key. Claiming is done with a single
+        conditional UPDATE, so a notification can't be claimed by two
+        owners at the same time.
+        """
+        now = datetime.datetime.now()
+        available = self.get_available(now).filter(pk__gt=after_pk)
+        pks = list(available.order_by('pk').values_list('pk', flat=True)[:size])
+        if not pks:
+            return []
+
+        available.filter(pk__in=pks).update(claimed_by=owner,
+                                            claimed_until=now + self.lease)
+        claimed = Notification.objects.filter(pk__in=pks, claimed_by=owner)
+        return list(claimed.select_related('user').order_by('pk'))
+
+    def release(self, owner, pks):
+        """Makes claimed notifications available for other dispatchers
+        """
+        if pks:
+            notifications = Notification.objects.filter(pk__in=list(pks),
+                                                        claimed_by=owner)
+            notifications.update(claimed_by='', claimed_until=None)
+
+    def create(self, title, content, user, related_object=None, key=''):
         """Creates a new notification but DO NOT SAVES that notification
         """
         return Notification(title=title, content=content, user=user,
-                            related_object=related_object)
+                            related_object=related_object, key=key,
+                            last_occurrence=datetime.datetime.now())
+
+    def get_key(self, related_object):
+        """
+        Returns key identifying notifications that may be merged; objects
+        support this by defining the get_notification_key() method
+        """
+        get_key = getattr(related_object, 'get_notification_key', None)
+        if get_key:
+            return get_key()
+        return ''
+
+    def add(self, title, content, user, related_object=None, limit=True):
+        """
+        Creates notification and saves it. If the user already has
+        a notification with the same key, created within the coalescing
+        window and not claimed by a dispatcher yet, that notification is
+        updated instead. When the user exceeds the rate limit, the first
+        excess notification is replaced with a warning and the following
+        ones are dropped. Returns None if no new notification was saved.
 
-    def add(self, title, content, user, related_object=None):
-        """Creates notification and saves it
+        Notifications which must not be lost (e.g. scheduled reports)
+        should be added with limit set to False; they are neither merged
+        nor counted to the rate limit.
         """
-        notification = self.create(title, content, user, related_object)
+        now = datetime.datetime.now()
+        key = self.get_key(related_object) if limit else ''
+        if key and self.window and self.coalesce(user, key, now):
+            return None
+
+        if limit and self.rate_limit:
+            count = self.increment_rate(user, now)
+            if count == self.rate_limit + 1:
+                self.create(_("Notifications limit exceeded"),
+                            _("You received too many notifications, "
+                              "the following ones will be suppressed."),
+                            user).save()
+            if count > self.rate_limit:
+                return None
+
+        notification = self.create(title, content, user, related_object, key)
         notification.save()
         return notification
 
-    def clear(self):
-        """Deletes all notifications that were fetched using get_all() method
+    def coalesce(self, user, key, now):
         """
-        if self._buffer:
-            self._buffer.delete()
-            self._buffer = []
-        else:
-            raise NotificationBufferEmpty()
+        Merges occurrence of a notification into the pending notification
+        with the same key; returns False if there was nothing to merge with
+        """
+        notifications = Notification.objects.filter(user=user, key=key,
+            created__gte=now - self.window, claimed_by='')
+        updated = notifications.update(count=F('count') + 1,
+                                       last_occurrence=now)
+        return bool(updated)
+
+    def increment_rate(self, user, now):
+        """
+        Counts notification in the user's current time window and returns
+        number of notifications in that window
+        """
+        rate, created = NotificationRate.objects.get_or_create(user=user,
+            defaults={'window_start': now})
+        rates = NotificationRate.objects.filter(pk=rate.pk)
+        if rate.window_start < now - self.window:
+            rates.update(window_start=now, count=1)
+            return 1
+        rates.update(count=F('count') + 1)
+        return rate.count + 1
+
+    def remove(self, owner, pks):
+        """Deletes notifications with specified keys claimed by the owner
+        """
+        if pks:
+            notifications = Notification.objects.filter(pk__in=list(pks),
+                                                        claimed_by=owner)
+            notifications.delete()
 
 
 manager = NotificationsManager()
-dispatcher = Dispatcher(manager)
+registry = BackendsRegistry()
+dispatcher = Dispatcher(manager, registry)
@@ -23,7 +23,7 @@ from django.test import TestCase
 
 from netadmin.networks.models import Host
 from utils import user_has_access, grant_access, revoke_access, \
-    user_can_edit, grant_edit, revoke_edit
+    user_can_edit, grant_edit, revoke_edit, user_object_ids, sharing_user_ids
 
 class ShareTest(TestCase):
     """Tests for class-based permissions system
@@ -191,3 +191,12 @@ class PermissionsTest(TestCase):
         grant_edit(self.host, self.user_b)
         edit = user_can_edit(self.host, self.user_b)
         self.assertEqual(edit, True)
+
+    def test_user_object_ids(self):
+        self.assertEqual(user_object_ids(self.user_a, Host), [self.host.pk])
+        self.assertEqual(user_object_ids(self.user_b, Host), [])
+
+        grant_access(self.host, self.user_b)
+        self.assertEqual(user_object_ids(self.user_b, Host), [self.host.pk])
+        self.assertEqual(sorted(sharing_user_ids(self.host)),
+                         sorted([self.user_a.pk, self.user_b.pk]))
@@ -119,16 +119,7 @@ class SharedObject(object):
     def shared_objects(cls, user):
         """Returns list of objects owned or shared by the user
         """
-        owned = cls.objects.filter(user=user)
-        pks = [obj.pk for obj in owned]
-
-        ct = ContentType.objects.get_for_model(cls)
-        access = ObjectPermission.objects.filter(content_type=ct, user=user)
-        for obj in access:
-            if obj.content_object.pk not in pks:
-                pks.append(obj.content_object.pk)
-                
-        return cls.objects.filter(pk__in=pks)
+        return filter_user_objects(user, cls)
 
 def user_has_access(obj, user):
     """Returns True if user has permission to access the object"""
@@ -157,16 +148,51 @@ def user_can_edit(obj, user):
     else:
         return False
     
-def filter_user_objects(user, model):
-    """Returns all objects accessible to the user"""
-    owned = model.objects.filter(user=user)
-    pks = [obj.pk for obj in owned]
+def user_object_ids(user, model):
+    """
+    Returns list of primary keys of objects accessible to the user; only
+    keys are fetched, so the list may be used to filter querysets (also
+    search results) without loading the objects
+    """
+    pks = set(model.objects.filter(user=user).values_list('pk', flat=True))
     ct = ContentType.objects.get_for_model(model)
     access = ObjectPermission.objects.filter(content_type=ct, user=user)
-    for obj in access:
-        if obj.content_object.pk not in pks:
-            pks.append(obj.content_object.pk)
-    return model.objects.filter(pk__in=pks)
+    pks.update(access.values_list('object_id', flat=True))
+    return list(pks)
+
+def sharing_user_ids(obj):
+    """
+    Returns list of ids of users who have access to the object (including
+    its owner)
+    """
+    ct = ContentType.objects.get_for_model(obj.__class__)
+    perms = ObjectPermission.objects.filter(content_type=ct, object_id=obj.pk)
+    ids = set(perms.values_list('user', flat=True))
+    if getattr(obj, 'user_id', None):
+        ids.add(obj.user_id)
+    return list(ids)
+
+def sharing_user_ids_map(model, pks):
+    """
+    Returns dictionary mapping primary keys of objects of the model to
+    lists of ids of users who have access to them, with two queries for
+    all objects
+    """
+    pks = list(pks)
+    ids = dict((pk, set()) for pk in pks)
+    if 'user' in [field.name for field in model._meta.fields]:
+        owners = model.objects.filter(pk__in=pks).values_list('pk', 'user')
+        for pk, user_id in owners:
+            ids[pk].add(user_id)
+    ct = ContentType.objects.get_for_model(model)
+    perms = ObjectPermission.objects.filter(content_type=ct, object_id__in=pks)
+    for object_id, user_id in perms.values_list('object_id', 'user'):
+        ids.setdefault(object_id, set()).add(user_id)
+    return dict((pk, list(users)) for pk, users in ids.iteritems())
+
+def filter_user_objects(user, model):
+    """Returns all objects accessible to the user"""
+    return model.objects.filter(pk__in=user_object_ids(user, model))
     
 def grant_access(obj, user):
     if hasattr(obj, 'user') and obj.user == user:
@@ -121,6 +121,37 @@ Administrator templates--the string placed next to "action" tag is action's
 name.
 
 
+Notification back-ends
+----------------------
+
+Notifications are delivered to users by back-ends; Network Administrator
+comes with the e-mail back-end. To deliver notifications some other way,
+write a subclass of BaseBackend (netadmin.notifier.backends) with a unique
+__identifier__ and override its send() method. The method gets a list of
+notifications and should return the list of notifications it delivered.
+Then return the class from plugin's notification_backends() method:
+
+    from netadmin.notifier.backends import BaseBackend
+
+    class SMSBackend(BaseBackend):
+        __identifier__ = 'sms'
+
+        def send(self, notifications):
+            ...
+
+    class MyPlugin(Plugin):
+    
+        ...
+        
+        def notification_backends(self):
+            return [SMSBackend]
+
+The same class may also be added to the NOTIFIER_BACKENDS setting as
+a dotted path, e.g. 'my_package.backends.SMSBackend'. A single instance
+of every back-end is reused by the dispatcher, so it may keep its
+connections open between dispatches.
+
+
 Custom options
 --------------
 
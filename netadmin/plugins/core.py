@@ -70,6 +70,14 @@ class Plugin(object):
         """
         return []
     
+    def notification_backends(self):
+        """
+        Should return list of notification back-ends
+        
+        To read more about back-ends see: netadmin.notifier.backends
+        """
+        return []
+    
     def options(self):
         """
         Should return options dictionary
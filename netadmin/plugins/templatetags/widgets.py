@@ -38,6 +38,7 @@ def render_widget(object_id):
     widget = widget_settings.get_widget()
     template_name = widget.template_name
     context = widget.context(widget=widget_settings)
+    context.setdefault('user', widget_settings.widgets_area.user)
     t =  get_template("widgets/%s" % template_name)
     return t.render(Context(context))
 
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import time
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.utils.translation import ugettext as _
+
+from netadmin.reportmeta.utils import send_reports, REPORTS_PROCESSES
+
+
+class Command(NoArgsCommand):
+
+    help = _(u"Generates and sends reports that are due in the current hour")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--daemon', action='store_true', dest='daemon',
+                    default=False,
+                    help=_(u"Keep running and send reports every hour")),
+        make_option('--processes', type='int', dest='processes',
+                    default=REPORTS_PROCESSES,
+                    help=_(u"Number of processes rendering reports")),
+    )
+
+    def handle_noargs(self, **options):
+        processes = options.get('processes')
+        if not options.get('daemon'):
+            self.send(processes)
+            return
+
+        try:
+            while True:
+                self.send(processes)
+                now = datetime.datetime.now()
+                next_hour = now.replace(minute=0, second=0, microsecond=0) + \
+                    datetime.timedelta(hours=1)
+                time.sleep((next_hour - now).seconds + 1)
+        except KeyboardInterrupt:
+            pass
+
+    def send(self, processes):
+        self.stdout.write(_(u"Sending reports... "))
+        self.stdout.flush()
+
+        sent = send_reports(processes=processes)
+
+        self.stdout.write(_(u"%i sent.\n") % sent)
+        self.stdout.flush()
@@ -18,18 +18,25 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import calendar
 import datetime
+import os
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes import generic
 from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
 from django.core.urlresolvers import reverse
 from django.db import models
+from django.db.models import Q, Max
 from django.utils.translation import ugettext as _
-from geraldo.generators import PDFGenerator
 
-from netadmin.networks.reports import HostReport, NetworkReport
-from netadmin.events.models import EventType
+from netadmin.networks.reports import HostReport, NetworkReport, \
+    report_rows, iter_report_rows, render_pdf
+from netadmin.events.models import Event, EventType
+from netadmin.networks.models import NetworkHost
 
 
 DAILY = 0
@@ -54,6 +61,27 @@ SEND_WEEK_DAYS = (
     (7, _("Sunday"))
 )
 
+REPORTS_PATH = getattr(settings, 'REPORTS_PATH',
+                       os.path.join(settings.MEDIA_ROOT, 'reports'))
+
+reports_storage = FileSystemStorage(location=REPORTS_PATH)
+
+
+class ReportMetaManager(models.Manager):
+    
+    def due(self, date=None):
+        """
+        Returns reports that should be sent at the given date (by default:
+        now). All three periods are checked with a single query which uses
+        indexes on the (period, send_hour, send_day_*) columns.
+        """
+        if not date:
+            date = datetime.datetime.now()
+        hour = Q(send_hour=date.hour)
+        return self.filter(hour & (Q(period=DAILY) |
+            Q(period=WEEKLY, send_day_week=date.weekday() + 1) |
+            Q(period=MONTHLY, send_day_month=date.day)))
+
 
 class ReportMeta(models.Model):
     """
@@ -71,6 +99,8 @@ class ReportMeta(models.Model):
     user = models.ForeignKey(User)
 
     reported_object = generic.GenericForeignKey('object_type', 'object_id')
+
+    objects = ReportMetaManager()
     
     def __unicode__(self):
         return "Report for %s" % self.reported_object.name
@@ -78,9 +108,16 @@ class ReportMeta(models.Model):
     def get_absolute_url(self):
         return reverse('reportmeta_detail', args=[self.pk])
     
+    def save(self, *args, **kwargs):
+        if self.pk:
+            self.clear_artifacts()
+        super(ReportMeta, self).save(*args, **kwargs)
+
     def delete(self, *args, **kwargs):
         related = ReportMetaEventType.objects.filter(report_meta=self)
         related.delete()
+        for artifact in ReportArtifact.objects.filter(report_meta=self):
+            artifact.delete()
         super(ReportMeta, self).delete(*args, **kwargs)
         
     def get_object_model(self):
@@ -89,52 +126,164 @@ class ReportMeta(models.Model):
     
     def get_event_types(self):
         """Returns event types related to the report"""
-        related = ReportMetaEventType.objects.filter(report_meta=self)
-        pks = [e.event_type.pk for e in related]
-        event_types = EventType.objects.filter(pk__in=pks)
-        return event_types
+        return EventType.objects.filter(reportmetaeventtype__report_meta=self)
     event_types = property(get_event_types)
     
-    def get_events(self):
-        """Returns events from host/network included in the report"""
-        events = self.reported_object.events()
-        pks = [et.pk for et in self.event_types]
-        events = events.filter(event_type__pk__in=pks)
-        
-        now = datetime.datetime.now()
-
-        if self.period == 0:
-            delta = datetime.timedelta(days=1)
-        elif self.period == 1:
-            delta = datetime.timedelta(days=7)
-        elif self.period == 2:
-            delta = datetime.timedelta(days=31)
-            
-        date_from = now - delta
-        events = events.filter(timestamp__gte=date_from)
-        
-        return events
+    def get_period_window(self, date=None):
+        """
+        Returns tuple (date_from, date_to) describing the period covered
+        by the report sent at the given date; the window ends at the full
+        hour, so reports generated within the same hour are the same.
+        Monthly reports cover a calendar month, e.g. from 5th of February
+        to 5th of March (or to the last day of a shorter month).
+        """
+        if not date:
+            date = datetime.datetime.now()
+        date_to = date.replace(minute=0, second=0, microsecond=0)
+        if self.period == DAILY:
+            return date_to - datetime.timedelta(days=1), date_to
+        elif self.period == WEEKLY:
+            return date_to - datetime.timedelta(days=7), date_to
+        year, month = date_to.year, date_to.month - 1
+        if not month:
+            year, month = year - 1, 12
+        day = min(date_to.day, calendar.monthrange(year, month)[1])
+        return date_to.replace(year=year, month=month, day=day), date_to
+
+    def get_current_window(self, date=None):
+        """
+        Returns period window of the report downloaded at the given date;
+        unlike scheduled reports it includes events from the current hour
+        """
+        if not date:
+            date = datetime.datetime.now()
+        return self.get_period_window(date + datetime.timedelta(hours=1))
+
+    def get_events(self, date_from=None, date_to=None):
+        """
+        Returns events from host/network included in the report within
+        the given period (by default: the current one; if only date_to is
+        given, the period ends at date_to). Hosts and event types are
+        selected with subqueries, so the whole thing is a single database
+        query.
+        """
+        if not date_from:
+            if date_to:
+                date_from = self.get_period_window(date_to)[0]
+            else:
+                date_from, date_to = self.get_current_window()
+        event_types = ReportMetaEventType.objects.filter(report_meta=self)
+        events = Event.objects.filter(
+            event_type__in=event_types.values('event_type'),
+            timestamp__gte=date_from)
+        if date_to:
+            events = events.filter(timestamp__lt=date_to)
+
+        if self.model.__name__ == 'Network':
+            hosts = NetworkHost.objects.filter(network=self.object_id)
+            events = events.filter(source_host__in=hosts.values('host'))
+        else:
+            events = events.filter(source_host=self.object_id)
+        return events.order_by('-timestamp')
 
     @property
     def has_events(self):
-        events = self.reported_object.events()
-        pks = [et.pk for et in self.event_types]
-        events = events.filter(event_type__pk__in=pks)
-        return events.exists()
+        return self.get_events().exists()
     
     def get_period_name(self):
         for number, name in REPORT_PERIOD:
             if number == self.period:
                 return name
     
-    def get_report(self):
+    def get_report_class(self):
         if self.model.__name__ == 'Host':
-            return HostReport(self.name, queryset=self.get_events())
+            return HostReport
         elif self.model.__name__ == 'Network':
-            return NetworkReport(self.name, queryset=self.get_events())
-        else:
+            return NetworkReport
+        return None
+
+    def get_columns(self):
+        """Returns columns of the report as (label, attribute, formatter)"""
+        return self.get_report_class().columns
+
+    def iter_rows(self, date_from=None, date_to=None):
+        """Yields rows of the report, one at a time"""
+        return iter_report_rows(self.get_events(date_from, date_to))
+
+    def get_rows(self, date_from=None, date_to=None):
+        """Returns list of all rows of the report"""
+        return report_rows(self.get_events(date_from, date_to))
+
+    def get_report(self, date_from=None, date_to=None):
+        report_class = self.get_report_class()
+        if not report_class:
+            return None
+        return report_class(self.name, queryset=self.get_rows(date_from,
+                                                              date_to))
+
+    def render_pdf(self, date_from=None, date_to=None):
+        """Returns content of the PDF report for the given period"""
+        return render_pdf(self.get_report_class(), self.name,
+                          self.get_rows(date_from, date_to))
+
+    def get_last_event_id(self, date_from, date_to):
+        """
+        Returns id of the newest event included in the report for the given
+        period (or 0 if there are no events); together with the period it
+        identifies content of the report
+        """
+        events = self.get_events(date_from, date_to)
+        return events.aggregate(last=Max('pk'))['last'] or 0
+
+    def find_artifact(self, date_from, date_to, last_event_id):
+        """Returns stored report for the given key or None"""
+        try:
+            return ReportArtifact.objects.get(report_meta=self,
+                date_from=date_from, date_to=date_to,
+                last_event_id=last_event_id)
+        except ReportArtifact.DoesNotExist:
             return None
 
+    def save_artifact(self, date_from, date_to, last_event_id, content):
+        """Stores rendered report and returns the artifact"""
+        artifact, created = ReportArtifact.objects.get_or_create(
+            report_meta=self, date_from=date_from, date_to=date_to,
+            last_event_id=last_event_id)
+        if created or not artifact.report:
+            artifact.report.save(artifact.get_filename(), ContentFile(content))
+        return artifact
+
+    def get_artifact(self, date=None):
+        """
+        Returns stored report for the period ending with the current hour
+        (events from the last hour are included). The report is rendered
+        only if there is no artifact for the period or new events were
+        added since it was generated; outdated artifacts are removed.
+        """
+        date_from, date_to = self.get_current_window(date)
+        last_event_id = self.get_last_event_id(date_from, date_to)
+        artifact = self.find_artifact(date_from, date_to, last_event_id)
+        if artifact:
+            return artifact
+
+        content = self.render_pdf(date_from, date_to)
+        artifact = self.save_artifact(date_from, date_to, last_event_id,
+                                      content)
+        self.clear_artifacts(exclude=artifact)
+        return artifact
+
+    def clear_artifacts(self, exclude=None):
+        """
+        Removes stored reports which were not sent by the scheduler, e.g.
+        after the report settings have changed
+        """
+        artifacts = ReportArtifact.objects.filter(report_meta=self,
+                                                  reportdelivery__isnull=True)
+        if exclude:
+            artifacts = artifacts.exclude(pk=exclude.pk)
+        for artifact in artifacts:
+            artifact.delete()
+
     def ready_to_send(self, date=None):
         if not date:
             date = datetime.datetime.now()
@@ -161,3 +310,77 @@ class ReportMetaEventType(models.Model):
     report_meta = models.ForeignKey(ReportMeta)
     event_type = models.ForeignKey(EventType)
 
+
+class ReportArtifact(models.Model):
+    """
+    Rendered PDF report. Artifact is identified by the report period and id
+    of the newest event included in it, so the report is generated again
+    only when there are new events in the period.
+    """
+    report_meta = models.ForeignKey(ReportMeta)
+    date_from = models.DateTimeField()
+    date_to = models.DateTimeField()
+    last_event_id = models.PositiveIntegerField(default=0)
+    report = models.FileField(upload_to='artifacts', storage=reports_storage,
+                              blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('report_meta', 'date_from', 'date_to',
+                           'last_event_id')
+
+    def __unicode__(self):
+        return "%s (%s - %s)" % (self.report_meta.name, self.date_from,
+                                 self.date_to)
+
+    def delete(self, *args, **kwargs):
+        if self.report:
+            self.report.delete(save=False)
+        super(ReportArtifact, self).delete(*args, **kwargs)
+
+    def get_filename(self):
+        return 'report-%i-%s-%i.pdf' % (self.report_meta.pk,
+                                        self.date_to.strftime('%Y%m%d%H'),
+                                        self.last_event_id)
+
+    def read(self):
+        """Returns content of the stored report"""
+        self.report.open('rb')
+        try:
+            return self.report.read()
+        finally:
+            self.report.close()
+
+
+class ReportDelivery(models.Model):
+    """
+    Report generated by the scheduler for a single period. There may be
+    only one delivery of a report for a given period, so the same report
+    is never sent twice.
+    """
+    report_meta = models.ForeignKey(ReportMeta)
+    date_from = models.DateTimeField()
+    date_to = models.DateTimeField()
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.BooleanField(default=False)
+    artifact = models.ForeignKey(ReportArtifact, null=True, blank=True)
+
+    class Meta:
+        unique_together = ('report_meta', 'date_to')
+
+    def __unicode__(self):
+        return "%s (%s - %s)" % (self.report_meta.name, self.date_from,
+                                 self.date_to)
+
+    def get_filename(self):
+        return 'report-%i-%s.pdf' % (self.report_meta.pk,
+                                     self.date_to.strftime('%Y%m%d%H'))
+
+    def get_attachment(self):
+        """
+        Notifier support: returns tuple (filename, content, mimetype)
+        of the file that should be attached to the notification
+        """
+        if not self.artifact or not self.artifact.report:
+            return None
+        return self.get_filename(), self.artifact.read(), 'application/pdf'
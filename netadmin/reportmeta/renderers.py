@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Renderers producing reports as CSV or plain HTML. Unlike the PDF generator
+they don't build the whole document in memory: every renderer is a generator
+yielding the output row by row, so it may be passed directly to HttpResponse.
+
+Rows are fetched in chunks while the output is generated, each chunk with
+its own query, so neither the document nor all the rows are kept in memory.
+Django closes the database connection when the view returns, before the
+response is iterated; the first query opens it again.
+"""
+
+import csv
+from cStringIO import StringIO
+
+from django.utils.encoding import smart_str
+from django.utils.html import escape
+
+
+def format_value(row, attribute, formatter):
+    value = getattr(row, attribute)
+    if formatter:
+        value = formatter(value)
+    return value
+
+def render_csv(columns, rows):
+    """Yields report as CSV lines, starting with the header"""
+    output = StringIO()
+    writer = csv.writer(output)
+
+    def line(values):
+        writer.writerow([smart_str(value) for value in values])
+        data = output.getvalue()
+        output.seek(0)
+        output.truncate()
+        return data
+
+    yield line([label for label, attribute, formatter in columns])
+    for row in rows:
+        yield line([format_value(row, attribute, formatter)
+                    for label, attribute, formatter in columns])
+
+def render_html(title, columns, rows):
+    """Yields report as simple HTML document with a single table"""
+    yield '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+    yield '<title>%s</title></head><body>\n' % smart_str(escape(title))
+    yield '<h1>%s</h1>\n<table>\n<tr>' % smart_str(escape(title))
+    yield ''.join(['<th>%s</th>' % escape(label)
+                   for label, attribute, formatter in columns])
+    yield '</tr>\n'
+    for row in rows:
+        cells = ['<td>%s</td>' % escape(format_value(row, attribute, formatter))
+                 for label, attribute, formatter in columns]
+        yield '<tr>%s</tr>\n' % smart_str(''.join(cells))
+    yield '</table>\n</body></html>\n'
+
+RENDERERS = {
+    'csv': ('text/csv', lambda title, columns, rows: render_csv(columns, rows)),
+    'html': ('text/html', render_html),
+}
+
+def render_report(report_meta, output_format, date_from=None, date_to=None):
+    """
+    Returns tuple (mimetype, generator) with the report for the given period
+    (by default: the current one) rendered in the given format
+    """
+    mimetype, renderer = RENDERERS[output_format]
+    rows = report_meta.iter_rows(date_from, date_to)
+    return mimetype, renderer(report_meta.name, report_meta.get_columns(),
+                              rows)
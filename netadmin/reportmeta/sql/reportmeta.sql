@@ -0,0 +1,3 @@
+-- Indexes used by the reports scheduler (see ReportMetaManager.due)
+CREATE INDEX reportmeta_reportmeta_due_week ON reportmeta_reportmeta (period, send_hour, send_day_week);
+CREATE INDEX reportmeta_reportmeta_due_month ON reportmeta_reportmeta (period, send_hour, send_day_month);
@@ -18,13 +18,20 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import datetime
+
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase
 from django.test.client import Client
 
-from netadmin.reportmeta.models import ReportMeta
+from netadmin.reportmeta.models import ReportMeta, ReportMetaEventType, \
+    ReportDelivery, DAILY, WEEKLY, MONTHLY
+from netadmin.reportmeta import utils
+from netadmin.reportmeta.utils import schedule_deliveries
 from netadmin.networks.models import Network, Host, NetworkHost
+from netadmin.networks.reports import iter_report_rows
+from netadmin.events.models import Event, EventType
 
 
 class ReportMetaTest(TestCase):
@@ -183,3 +190,216 @@ class ReportMetaTest(TestCase):
         self.assertRaises(ReportMeta.DoesNotExist, ReportMeta.objects.get,
                           **{'object_id': reportmeta_net_pk,
                              'object_type': ct_network})
+
+    def test_reportmeta_due(self):
+        """
+        Only reports which should be sent in the given hour should
+        be returned by the due() method
+        """
+        ct_host = ContentType.objects.get_for_model(Host)
+        # Monday, 5th of March 2012, 12:30
+        date = datetime.datetime(2012, 3, 5, 12, 30)
+        params = [(DAILY, 12, 1, 1), (DAILY, 13, 1, 1),
+                  (WEEKLY, 12, 1, 1), (WEEKLY, 12, 2, 1),
+                  (MONTHLY, 12, 1, 5), (MONTHLY, 12, 1, 6)]
+        reports = []
+        for period, hour, day_week, day_month in params:
+            report_meta = ReportMeta.objects.create(name='report',
+                period=period, send_hour=hour, send_day_week=day_week,
+                send_day_month=day_month, object_type=ct_host,
+                object_id=self.host.pk, user=self.user)
+            reports.append(report_meta)
+
+        due = ReportMeta.objects.due(date)
+        self.assertItemsEqual(due, [reports[0], reports[2], reports[4]])
+        for report_meta in reports:
+            self.assertEqual(report_meta.ready_to_send(date),
+                             report_meta in due)
+
+    def test_schedule_deliveries(self):
+        """The same report should not be scheduled twice for one period
+        """
+        ct_host = ContentType.objects.get_for_model(Host)
+        ReportMeta.objects.create(name='report', period=DAILY, send_hour=12,
+                                  object_type=ct_host, object_id=self.host.pk,
+                                  user=self.user)
+        date = datetime.datetime(2012, 3, 5, 12, 30)
+        deliveries = schedule_deliveries(date)
+        self.assertEqual(len(deliveries), 1)
+        self.assertEqual(deliveries[0].date_to,
+                         datetime.datetime(2012, 3, 5, 12))
+
+        deliveries[0].sent = True
+        deliveries[0].save()
+        self.assertEqual(schedule_deliveries(date), [])
+
+    def test_send_delivery(self):
+        """
+        Report should be passed to the notifier once, even if the user
+        exceeded the notifications rate limit
+        """
+        ct_host = ContentType.objects.get_for_model(Host)
+        ReportMeta.objects.create(name='report', period=DAILY, send_hour=12,
+                                  object_type=ct_host, object_id=self.host.pk,
+                                  user=self.user)
+        date = datetime.datetime(2012, 3, 5, 12, 30)
+        delivery = schedule_deliveries(date)[0]
+        original_rate_limit = utils.manager.rate_limit
+        utils.manager.rate_limit = 1
+        try:
+            # the second notification is replaced with a warning
+            for i in xrange(2):
+                utils.manager.add('title', 'content', self.user)
+            self.assertTrue(utils.send_delivery(delivery))
+            self.assertFalse(utils.send_delivery(delivery))
+        finally:
+            utils.manager.rate_limit = original_rate_limit
+        self.assertEqual(utils.manager.get_all().count(), 3)
+
+    def test_report_artifact(self):
+        """
+        Report should be rendered again only if there are new events
+        in the period
+        """
+        ct_host = ContentType.objects.get_for_model(Host)
+        report_meta = ReportMeta.objects.create(name='report', period=DAILY,
+            object_type=ct_host, object_id=self.host.pk, user=self.user)
+        event_type = EventType.objects.create(name='INFO', user=self.user)
+        ReportMetaEventType.objects.create(report_meta=report_meta,
+                                           event_type=event_type)
+        rendered = []
+        def render_pdf(date_from, date_to):
+            rendered.append((date_from, date_to))
+            return 'PDF'
+        report_meta.render_pdf = render_pdf
+
+        artifact = report_meta.get_artifact()
+        self.assertEqual(report_meta.get_artifact().pk, artifact.pk)
+        self.assertEqual(len(rendered), 1)
+        self.assertEqual(artifact.read(), 'PDF')
+
+        Event.objects.create(message='message', short_message='message',
+            timestamp=datetime.datetime.now(), protocol='SMTP',
+            event_type=event_type, source_host=self.host)
+        new_artifact = report_meta.get_artifact()
+        self.assertNotEqual(new_artifact.pk, artifact.pk)
+        self.assertEqual(len(rendered), 2)
+        new_artifact.delete()
+
+    def test_reportmeta_stream_report(self):
+        ct_host = ContentType.objects.get_for_model(Host)
+        report_meta = ReportMeta.objects.create(name='report', period=DAILY,
+            object_type=ct_host, object_id=self.host.pk, user=self.user)
+        event_type = EventType.objects.create(name='INFO', user=self.user)
+        ReportMetaEventType.objects.create(report_meta=report_meta,
+                                           event_type=event_type)
+        Event.objects.create(message='first, message',
+            short_message='message', timestamp=datetime.datetime.now(),
+            protocol='SMTP', event_type=event_type, source_host=self.host)
+
+        response = self.client.get('/report/get/%i/csv/' % report_meta.pk)
+        self.assertEqual(response.status_code, 200)
+        lines = response.content.splitlines()
+        self.assertEqual(lines[0], 'Timestamp,Message,Event type')
+        self.assertEqual(len(lines), 2)
+        self.assertIn('"first, message",INFO', lines[1])
+
+        response = self.client.get('/report/get/%i/html/' % report_meta.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('<td>first, message</td>', response.content)
+
+        response = self.client.get('/report/get/%i/csv/' % (report_meta.pk + 1))
+        self.assertEqual(response.status_code, 404)
+
+    def test_iter_report_rows(self):
+        """Rows should be fetched in chunks, ordered by timestamp"""
+        event_type = EventType.objects.create(name='INFO', user=self.user)
+        timestamp = datetime.datetime(2012, 3, 5, 12, 0)
+        for i, minutes in enumerate([3, 1, 1, 2, 0]):
+            Event.objects.create(message='message %i' % i,
+                short_message='message', protocol='SMTP',
+                timestamp=timestamp + datetime.timedelta(minutes=minutes),
+                event_type=event_type, source_host=self.host)
+        rows = iter_report_rows(Event.objects.all(), chunk_size=2)
+        self.assertEqual([row.message for row in rows],
+                         ['message 4', 'message 1', 'message 2',
+                          'message 3', 'message 0'])
+
+    def test_period_window(self):
+        ct_host = ContentType.objects.get_for_model(Host)
+        report_meta = ReportMeta(name='report', object_type=ct_host,
+                                 object_id=self.host.pk, user=self.user)
+        date = datetime.datetime(2012, 3, 31, 12, 30)
+        windows = [
+            (DAILY, datetime.datetime(2012, 3, 30, 12)),
+            (WEEKLY, datetime.datetime(2012, 3, 24, 12)),
+            (MONTHLY, datetime.datetime(2012, 2, 29, 12)),
+        ]
+        for period, date_from in windows:
+            report_meta.period = period
+            self.assertEqual(report_meta.get_period_window(date),
+                             (date_from, datetime.datetime(2012, 3, 31, 12)))
+
+        report_meta.period = MONTHLY
+        self.assertEqual(
+            report_meta.get_period_window(datetime.datetime(2012, 1, 5, 12)),
+            (datetime.datetime(2011, 12, 5, 12),
+             datetime.datetime(2012, 1, 5, 12)))
+
+    def test_reportmeta_has_events(self):
+        """Only events within the period window should be taken into account
+        """
+        ct_network = ContentType.objects.get_for_model(Network)
+        report_meta = ReportMeta.objects.create(name='report', period=DAILY,
+            object_type=ct_network, object_id=self.network.pk,
+            user=self.user)
+        event_type = EventType.objects.create(name='INFO', user=self.user)
+        ReportMetaEventType.objects.create(report_meta=report_meta,
+                                           event_type=event_type)
+        event = Event.objects.create(message='message',
+            short_message='message', protocol='SMTP', event_type=event_type,
+            source_host=self.host,
+            timestamp=datetime.datetime.now() - datetime.timedelta(days=2))
+        self.assertFalse(report_meta.has_events)
+
+        event.timestamp = datetime.datetime.now()
+        event.save()
+        self.assertTrue(report_meta.has_events)
+        self.assertEqual(list(report_meta.get_events()), [event])
+
+        # explicit end of the period should be honoured
+        date_to = event.timestamp - datetime.timedelta(hours=1)
+        self.assertFalse(report_meta.get_events(date_to=date_to).exists())
+        self.assertTrue(report_meta.get_events(date_to=event.timestamp +
+            datetime.timedelta(hours=1)).exists())
+
+    def test_send_reports(self):
+        """
+        Workers should get prefetched rows and every report should be
+        passed to the notifier once
+        """
+        ct_host = ContentType.objects.get_for_model(Host)
+        for i in xrange(3):
+            ReportMeta.objects.create(name='report %i' % i, period=DAILY,
+                send_hour=12, object_type=ct_host, object_id=self.host.pk,
+                user=self.user)
+        tasks = []
+        def render_pdf(report_class, title, rows):
+            tasks.append((report_class, title, rows))
+            return 'PDF'
+        original_render_pdf = utils.render_pdf
+        utils.render_pdf = render_pdf
+        try:
+            date = datetime.datetime(2012, 3, 5, 12, 30)
+            self.assertEqual(utils.send_reports(date, processes=1), 3)
+            self.assertEqual(utils.send_reports(date, processes=1), 0)
+        finally:
+            utils.render_pdf = original_render_pdf
+
+        self.assertEqual(len(tasks), 3)
+        for report_class, title, rows in tasks:
+            self.assertEqual(rows, [])
+        self.assertEqual(utils.manager.get_all().count(), 3)
+        for delivery in ReportDelivery.objects.all():
+            self.assertEqual(delivery.get_attachment()[1], 'PDF')
+            delivery.artifact.delete()
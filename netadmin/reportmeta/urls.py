@@ -28,6 +28,7 @@ urlpatterns = patterns('netadmin.reportmeta.views',
     url(r'^$', 'reports', name='reports'),
     url(r'^(?P<object_id>\d+)/$', 'reportmeta_detail', name='reportmeta_detail'),
     url(r'^get/(?P<object_id>\d+)/$', 'reportmeta_get_report', name='reportmeta_get_report'),
+    url(r'^get/(?P<object_id>\d+)/(?P<output_format>csv|html)/$', 'reportmeta_stream_report', name='reportmeta_stream_report'),
     url(r'^list/(?P<object_type>host|network)/$', 'reportmeta_list', name='reportmeta_list'),
     url(r'^new/(?P<object_type>host|network)/$', 'reportmeta_new', name="reportmeta_new"),
     url(r'^new/(?P<object_type>host|network)/(?P<object_id>\d+)/$', 'reportmeta_new_from_object', name="reportmeta_new"),
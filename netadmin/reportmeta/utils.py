@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Scheduled reports. Every hour the scheduler picks reports that are due,
+creates a delivery for each of them (one per report and period, so a report
+is never sent twice), renders PDFs in a pool of processes and passes them
+to the notifier. Reports already stored as artifacts are not rendered again.
+"""
+
+try:
+    from multiprocessing import Pool
+except ImportError:
+    Pool = None
+
+from django.conf import settings
+from django.db import connection
+from django.utils.translation import ugettext as _
+
+from netadmin.networks.reports import render_pdf
+from netadmin.notifier import manager
+from netadmin.reportmeta.models import ReportMeta, ReportDelivery
+
+
+# number of processes rendering reports (None means number of CPUs)
+REPORTS_PROCESSES = getattr(settings, 'REPORTS_PROCESSES', None)
+
+# number of reports rendered at once; rows of all reports in a batch
+# are kept in memory of the parent process
+REPORTS_BATCH_SIZE = getattr(settings, 'REPORTS_BATCH_SIZE', 10)
+
+
+def _render_task(task):
+    return render_pdf(*task)
+
+def _chunks(items, size):
+    for i in xrange(0, len(items), size):
+        yield items[i:i + size]
+
+def render_deliveries(deliveries, processes=REPORTS_PROCESSES,
+                      batch_size=REPORTS_BATCH_SIZE):
+    """
+    Attaches artifacts to all deliveries. Reports which have not been stored
+    yet are rendered in a pool of processes, in batches of the given size.
+    Rows of every report are fetched by the parent process and passed to
+    workers, so workers don't use the database at all.
+    """
+    missing = []
+    for delivery in deliveries:
+        report_meta = delivery.report_meta
+        last_event_id = report_meta.get_last_event_id(delivery.date_from,
+                                                      delivery.date_to)
+        delivery.artifact = report_meta.find_artifact(delivery.date_from,
+            delivery.date_to, last_event_id)
+        if not delivery.artifact:
+            missing.append((delivery, last_event_id))
+    if not missing:
+        return
+
+    pool = None
+    if Pool and processes != 1 and len(missing) > 1:
+        # forked workers must not share the database connection
+        # with the parent process
+        connection.close()
+        pool = Pool(processes)
+    try:
+        for batch in _chunks(missing, batch_size):
+            tasks = []
+            for delivery, last_event_id in batch:
+                report_meta = delivery.report_meta
+                rows = report_meta.get_rows(delivery.date_from,
+                                            delivery.date_to)
+                tasks.append((report_meta.get_report_class(),
+                              report_meta.name, rows))
+            if pool:
+                contents = pool.map(_render_task, tasks, 1)
+            else:
+                contents = [_render_task(task) for task in tasks]
+
+            for (delivery, last_event_id), content in zip(batch, contents):
+                delivery.artifact = delivery.report_meta.save_artifact(
+                    delivery.date_from, delivery.date_to, last_event_id,
+                    content)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+def schedule_deliveries(date=None):
+    """
+    Creates deliveries for reports due at the given date and returns
+    those of them that haven't been sent yet
+    """
+    deliveries = []
+    for report_meta in ReportMeta.objects.due(date):
+        date_from, date_to = report_meta.get_period_window(date)
+        delivery, created = ReportDelivery.objects.get_or_create(
+            report_meta=report_meta, date_to=date_to,
+            defaults={'date_from': date_from})
+        if not delivery.sent:
+            deliveries.append(delivery)
+    return deliveries
+
+def send_delivery(delivery):
+    """
+    Passes the rendered report to the notifier. The delivery is marked
+    as sent before that, with a conditional update, so even two schedulers
+    running at the same time won't send the same report twice. Returns
+    False if the delivery has been already sent.
+    """
+    updated = ReportDelivery.objects.filter(pk=delivery.pk, sent=False)
+    if not updated.update(sent=True, artifact=delivery.artifact):
+        return False
+    delivery.sent = True
+
+    report_meta = delivery.report_meta
+    title = _("Report: %s") % report_meta.name
+    content = _("Report for period from %(from)s to %(to)s is attached.") % \
+        {'from': delivery.date_from, 'to': delivery.date_to}
+    # reports are sent once, so they bypass the notifications rate limit
+    manager.add(title, content, report_meta.user, delivery, limit=False)
+    return True
+
+def send_reports(date=None, processes=REPORTS_PROCESSES):
+    """
+    Generates and sends all reports due at the given date (by default:
+    now); returns number of sent reports
+    """
+    deliveries = schedule_deliveries(date)
+    render_deliveries(deliveries, processes)
+    sent = 0
+    for delivery in deliveries:
+        if send_delivery(delivery):
+            sent += 1
+    return sent
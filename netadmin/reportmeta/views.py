@@ -20,14 +20,17 @@
 
 from django.contrib.auth.decorators import login_required
 from django.contrib.contenttypes.models import ContentType
+from django.core.servers.basehttp import FileWrapper
 from django.core.urlresolvers import reverse
 from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
 from django.views.generic.simple import direct_to_template, redirect_to
 from django.views.generic.list_detail import object_list, object_detail
 from django.views.generic.create_update import *
 
 from netadmin.reportmeta.models import ReportMeta, ReportMetaEventType
 from netadmin.reportmeta.forms import ReportMetaForm, ReportMetaNewForm
+from netadmin.reportmeta.renderers import render_report
 from netadmin.networks.models import Host, Network
 from netadmin.notifier import dispatcher, manager
 from netadmin.events.models import EventType
@@ -162,6 +165,7 @@ def reportmeta_update(request, object_id):
                     rel = ReportMetaEventType(report_meta=report_meta,
                                               event_type=event_type)
                     rel.save()
+            report_meta.clear_artifacts()
                     
             redirect_url = reverse('reportmeta_update', args=[object_id])
             return redirect_to(request, redirect_url, permanent=False)
@@ -186,9 +190,24 @@ def reportmeta_delete(request, object_id):
 
 @login_required    
 def reportmeta_get_report(request, object_id):
-    from geraldo.generators import PDFGenerator
     report_meta = ReportMeta.objects.get(pk=object_id, user=request.user)
-    report = report_meta.get_report()
-    response = HttpResponse(mimetype='application/pdf')
-    report.generate_by(PDFGenerator, filename=response)
+    artifact = report_meta.get_artifact()
+    artifact.report.open('rb')
+    response = HttpResponse(FileWrapper(artifact.report.file),
+                            mimetype='application/pdf')
+    response['Content-Length'] = artifact.report.size
+    response['Content-Disposition'] = 'inline; filename=%s' % \
+        artifact.get_filename()
+    return response
+
+@login_required
+def reportmeta_stream_report(request, object_id, output_format):
+    """Sends report as CSV or HTML, row by row"""
+    report_meta = get_object_or_404(ReportMeta, pk=object_id,
+                                    user=request.user)
+    mimetype, content = render_report(report_meta, output_format)
+    response = HttpResponse(content, mimetype=mimetype)
+    if output_format == 'csv':
+        response['Content-Disposition'] = 'attachment; filename=report-%i.csv' \
+            % report_meta.pk
     return response
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Helpers for searching events, hosts and networks. Every type of objects is
+searched separately and only the first SEARCH_MAX_RESULTS results (the most
+relevant ones when the search engine ranks them) are paginated, so broad
+queries never fetch all hits:
+
+    page = paginate_results(search_objects(user, 'error', Event), page=2)
+
+Results are filtered by user access in the query itself (see
+permissions.utils.user_object_ids and the 'users' field of search indexes).
+"""
+
+from django.conf import settings
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+
+from netadmin.events.models import Event
+from netadmin.networks.models import Host, Network
+from netadmin.permissions.utils import user_object_ids
+
+
+SEARCH_RESULTS_PER_PAGE = getattr(settings, 'SEARCH_RESULTS_PER_PAGE', 20)
+SEARCH_MAX_RESULTS = getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+
+SEARCH_MODELS = (
+    ('events', Event),
+    ('hosts', Host),
+    ('networks', Network),
+)
+
+
+class TopResultsPaginator(Paginator):
+    """
+    Paginator which limits results to the first max_results objects. The
+    number of results is counted by the database or the search engine only
+    when it is needed and objects are fetched one page at a time.
+    """
+    def __init__(self, object_list, per_page=SEARCH_RESULTS_PER_PAGE,
+                 max_results=SEARCH_MAX_RESULTS, **kwargs):
+        super(TopResultsPaginator, self).__init__(object_list, per_page,
+                                                  **kwargs)
+        self.max_results = max_results
+
+    def _get_count(self):
+        if self._count is None:
+            try:
+                count = self.object_list.count()
+            except (AttributeError, TypeError):
+                count = len(self.object_list)
+            self._count = min(count, self.max_results)
+        return self._count
+    count = property(_get_count)
+
+def search_objects(user, query, model):
+    """
+    Returns objects of the model matching the query and accessible to the
+    user: SearchQuerySet with Haystack, queryset with nonrel-search.
+    Haystack results are ordered by relevance, events found with
+    nonrel-search by timestamp.
+    """
+    if 'haystack' in settings.INSTALLED_APPS:
+        from haystack.query import SearchQuerySet
+        results = SearchQuerySet().models(model)
+        return results.filter(content=query, users=user.pk).load_all()
+
+    if 'search' in settings.INSTALLED_APPS:
+        from search.core import search
+        results = search(model, query)
+        if model is Event:
+            host_pks = user_object_ids(user, Host)
+            results = results.filter(source_host__pk__in=host_pks)
+            return results.order_by('-timestamp')
+        return results.filter(pk__in=user_object_ids(user, model))
+
+    return model.objects.none()
+
+def paginate_results(results, page=1, per_page=SEARCH_RESULTS_PER_PAGE,
+                     max_results=SEARCH_MAX_RESULTS):
+    """Returns page of the top results"""
+    paginator = TopResultsPaginator(results, per_page, max_results)
+    try:
+        return paginator.page(page)
+    except PageNotAnInteger:
+        return paginator.page(1)
+    except EmptyPage:
+        return paginator.page(paginator.num_pages)
+
+def get_object(result):
+    """Returns object for search result of any backend"""
+    return getattr(result, 'object', result)
@@ -18,33 +18,63 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import datetime
 from datetime import timedelta
 from events.models import Event, EventType
 from networks.models import Host, Network
 from users.models import UserProfile
 
 from django.contrib.auth.models import User
+from django.db.models.query import QuerySet
+
+from netadmin.utils.charts.timeseries import TimeSeries
+from netadmin.utils.timehelper import DELTA_DAY
+
+
+def _filter_related(events, field, objects):
+    """
+    Filters events by related objects; querysets are used as subqueries,
+    so they are not evaluated here (and an empty queryset selects nothing)
+    """
+    if isinstance(objects, QuerySet):
+        return events.filter(**{'%s__in' % field: objects.values('pk')})
+    if objects:
+        pks = [obj.pk for obj in objects]
+        return events.filter(**{'%s__pk__in' % field: pks})
+    return events
 
 def get_events(time_from=None, time_to=None, source_hosts=[], event_types=[]):
     """
     get_events(...) -> QuerySet
     
     Returns events, optionally filtering them by timestamp
-    or source hosts.
+    or source hosts. Hosts and event types may be given as lists
+    or querysets.
     """
     events = Event.objects.all()
-    if source_hosts:
-        pks = [host.pk for host in source_hosts]
-        events = events.filter(source_host__pk__in=pks)
-    if event_types:
-        pks = [et.pk for et in event_types]
-        events = events.filter(event_type__pk__in=pks)
+    events = _filter_related(events, 'source_host', source_hosts)
+    events = _filter_related(events, 'event_type', event_types)
     if time_from:
         events = events.filter(timestamp__gte=time_from)
     if time_to:
         events = events.filter(timestamp__lt=time_to)
     return events
 
+def get_events_histogram(date_from, date_to=None, source_hosts=[],
+                         event_types=[]):
+    """
+    get_events_histogram(...) -> (days, counts)
+    
+    Returns list of days from the given range (by default: till today)
+    and list with number of events reported in each of them. Events are
+    counted with a single aggregated query.
+    """
+    if not date_to:
+        date_to = datetime.date.today()
+    events = get_events(source_hosts=source_hosts, event_types=event_types)
+    series = TimeSeries(events, date_from, date_to + DELTA_DAY, bucket='day')
+    return [label.date() for label in series.labels], series.counts
+
 def get_eventtypes(user=None, alert=0):
     """
     get_eventtypes(...) -> QuerySet
@@ -21,3 +21,4 @@
 from charttools import LineChart, ColumnChart, ScatterChart, \
     AnnotatedTimeLine, PieChart, NumberColumn, StringColumn, \
     DateColumn, DatetimeColumn
+from timeseries import TimeSeries
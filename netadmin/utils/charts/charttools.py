@@ -18,6 +18,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
 from core import Chart, ChartColumn
 
 
@@ -45,6 +50,13 @@ class DatatableColumn(ChartColumn):
         return [self.format(value) for value in self._data]
     
     data = property(get_data)
+    
+    def to_json(self, value):
+        """Returns value in the DataTable JSON format"""
+        return value
+    
+    def get_json_data(self):
+        return [self.to_json(value) for value in self._data]
         
 class NumberColumn(DatatableColumn):
     type_name = 'number'
@@ -55,12 +67,19 @@ class StringColumn(DatatableColumn):
     def format(self, value):
         return "'%s'" % value
     
+    def to_json(self, value):
+        return unicode(value)
+    
 class DateColumn(DatatableColumn):
     type_name = 'date'
     
     def format(self, value):
         return 'new Date(%i, %i, %i)' % \
             (value.year, value.month, value.day)
+    
+    def to_json(self, value):
+        # months are numbered from 0 in JavaScript
+        return 'Date(%i, %i, %i)' % (value.year, value.month - 1, value.day)
             
 class DatetimeColumn(DatatableColumn):
     type_name = 'datetime'
@@ -69,6 +88,11 @@ class DatetimeColumn(DatatableColumn):
         return 'new Date(%i, %i, %i, %i, %i, %i)' % \
             (value.year, value.month, value.day,
              value.hour, value.minute, value.second)
+    
+    def to_json(self, value):
+        return 'Date(%i, %i, %i, %i, %i, %i)' % \
+            (value.year, value.month - 1, value.day,
+             value.hour, value.minute, value.second)
 
 
 class ChartToolsChart(Chart):
@@ -86,6 +110,27 @@ class ChartToolsChart(Chart):
             # we assume that all columns have the same length
             return len(self.columns[0])
         return 0
+    
+    def get_datatable(self):
+        """
+        Returns chart data as dictionary in the Google DataTable format,
+        see: https://developers.google.com/chart/interactive/docs/reference#dataparam
+        """
+        cols = [{'id': 'col%i' % i, 'label': unicode(col.name),
+                 'type': col.type_name}
+                for i, col in enumerate(self.columns)]
+        values = [col.get_json_data() for col in self.columns]
+        rows = [{'c': [{'v': value} for value in row]}
+                for row in zip(*values)]
+        return {'cols': cols, 'rows': rows}
+    
+    def to_json(self):
+        """
+        Returns chart data serialized to JSON; the result is safe to embed
+        in a script element
+        """
+        return json.dumps(self.get_datatable(),
+                          separators=(',', ':')).replace('</', '<\\/')
 
 class LineChart(ChartToolsChart):
     chart_type = 'LineChart'
@@ -19,10 +19,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from django import template
+from django.core.urlresolvers import reverse
 from django.utils.translation import ugettext as _
 
 from netadmin.utils.charts.charttools import CHART_TOOLS_PACKAGES, \
     InvalidChartsPackage
+from netadmin.utils.charts.views import cache_chart, is_cache_shared
 
 
 register = template.Library()
@@ -36,6 +38,25 @@ def chart(chart, width=None, height=None):
         chart.height = height
     return {'chart': chart}
 
+@register.inclusion_tag('charts/chart_tools/chart.html', takes_context=True)
+def remote_chart(context, chart, width=None, height=None):
+    """
+    Renders chart which data is not embedded in the page, but fetched
+    from the chart data endpoint; falls back to the embedded data if
+    there is no authenticated user in the context or the cache is local
+    to the process (see is_cache_shared)
+    """
+    if width:
+        chart.width = width
+    if height:
+        chart.height = height
+    user = context.get('user')
+    if user is None or not user.is_authenticated() or not is_cache_shared():
+        return {'chart': chart}
+    key = cache_chart(chart, user)
+    return {'chart': chart,
+            'data_url': reverse('chart_data', args=[key])}
+
 @register.inclusion_tag('charts/chart_tools/annotatedtimeline.html')
 def chart_annotatedtimeline(chart):
     return {'chart': chart}
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import datetime
+
+from django.core.urlresolvers import reverse
+from django.template import Context, Template
+
+from netadmin.utils.charts import ColumnChart, DateColumn, NumberColumn
+from netadmin.utils.charts.views import cache_chart, is_cache_shared
+from netadmin.utils.testutils import BaseTest
+
+
+class ChartTest(BaseTest):
+    """Tests for charts data"""
+
+    def setUp(self):
+        super(ChartTest, self).setUp()
+        self.chart = ColumnChart('Events')
+        self.chart.add_column('Day', [datetime.date(2012, 3, 5)], DateColumn)
+        self.chart.add_column('Events', [10], NumberColumn)
+
+    def test_to_json(self):
+        """Chart should be serialized in the DataTable format"""
+        table = json.loads(self.chart.to_json())
+        self.assertEqual([col['type'] for col in table['cols']],
+                         ['date', 'number'])
+        self.assertEqual(table['rows'],
+                         [{'c': [{'v': 'Date(2012, 2, 5)'}, {'v': 10}]}])
+
+    def test_chart_data(self):
+        """Cached chart should be returned in the wire format"""
+        url = reverse('chart_data', args=[cache_chart(self.chart, self.user)])
+        response = self.client.get(url, {'tqx': 'reqId:3;out:json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(
+            'google.visualization.Query.setResponse({'))
+        self.assertIn('"reqId":"3"', response.content)
+        self.assertIn(self.chart.to_json(), response.content)
+
+        url = reverse('chart_data', args=['0' * 32])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_chart_data_owner(self):
+        """Cached chart should not be available to other users"""
+        other = self.create_user('other', 'other')
+        url = reverse('chart_data', args=[cache_chart(self.chart, other)])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_remote_chart(self):
+        """
+        Chart data should be embedded in the page unless the cache is
+        shared by all processes
+        """
+        template = Template('{% load chart_tools %}{% remote_chart chart %}')
+        content = template.render(Context({'chart': self.chart,
+                                           'user': self.user}))
+        self.assertEqual(self.chart.to_json() in content,
+                         not is_cache_shared())
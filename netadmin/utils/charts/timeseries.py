@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Time series for charts. TimeSeries counts objects from a queryset in time
+buckets (minutes, hours, days or weeks) with a single aggregated query,
+fills buckets without objects with zeros and passes the result to a chart:
+
+    series = TimeSeries(events, date_from, date_to, bucket='hour',
+                        timezone='Europe/Warsaw', max_points=100)
+    chart = LineChart(_("Events"))
+    series.add_to_chart(chart, _("Time"), _("Number of events"))
+
+Timestamps are truncated by the database (PostgreSQL, MySQL and SQLite are
+supported); for other backends they are fetched and counted in Python.
+"""
+
+import datetime
+import math
+
+import pytz
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+
+from charttools import DateColumn, DatetimeColumn, NumberColumn
+
+
+BUCKETS = {
+    'minute': datetime.timedelta(minutes=1),
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+    'week': datetime.timedelta(days=7),
+}
+
+SQLITE_FORMATS = {
+    'minute': '%Y-%m-%d %H:%M:00',
+    'hour': '%Y-%m-%d %H:00:00',
+    'day': '%Y-%m-%d 00:00:00',
+}
+
+MYSQL_FORMATS = {
+    'minute': '%Y-%m-%d %H:%i:00',
+    'hour': '%Y-%m-%d %H:00:00',
+    'day': '%Y-%m-%d 00:00:00',
+}
+
+
+class InvalidBucket(Exception):
+    pass
+
+
+def truncate(value, bucket):
+    """Returns beginning of the bucket containing the given datetime"""
+    value = value.replace(second=0, microsecond=0)
+    if bucket == 'minute':
+        return value
+    value = value.replace(minute=0)
+    if bucket == 'hour':
+        return value
+    value = value.replace(hour=0)
+    if bucket == 'week':
+        value -= datetime.timedelta(days=value.weekday())
+    return value
+
+def _vendor(connection):
+    vendor = getattr(connection, 'vendor', None)
+    if vendor:
+        return vendor
+    engine = connection.settings_dict.get('ENGINE', '')
+    for name in ('postgresql', 'mysql', 'sqlite'):
+        if name in engine:
+            return name
+    return None
+
+def truncate_sql(connection, unit, column):
+    """
+    Returns SQL expression truncating the column to the given unit or None
+    if the database is not supported. Percent signs are doubled, as the
+    expression is passed through parameters substitution.
+    """
+    vendor = _vendor(connection)
+    if vendor == 'postgresql':
+        return "date_trunc('%s', %s)" % (unit, column)
+    elif vendor == 'mysql':
+        return "DATE_FORMAT(%s, '%s')" % (column,
+            MYSQL_FORMATS[unit].replace('%', '%%'))
+    elif vendor == 'sqlite':
+        return "strftime('%s', %s)" % (SQLITE_FORMATS[unit].replace('%', '%%'),
+                                       column)
+    return None
+
+def _as_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.combine(value, datetime.time())
+
+def _to_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value.replace(tzinfo=None)
+    return datetime.datetime.strptime(str(value)[:19], '%Y-%m-%d %H:%M:%S')
+
+
+class TimeSeries(object):
+    """
+    Numbers of objects from the queryset in consecutive time buckets.
+    Dates passed to the constructor and labels of buckets are expressed
+    in the given timezone (by default: the server timezone).
+
+    If group_by is a name of a field, objects are counted separately for
+    every value of the field. If max_points is set and there would be more
+    buckets, consecutive buckets are merged, so the series never has more
+    than max_points values.
+    """
+
+    def __init__(self, queryset, date_from, date_to, bucket='day',
+                 timezone=None, field='timestamp', group_by=None,
+                 max_points=None):
+        if bucket not in BUCKETS:
+            raise InvalidBucket(bucket)
+        self.queryset = queryset
+        self.bucket = bucket
+        self.field = field
+        self.group_by = group_by
+        self.max_points = max_points
+
+        self.server_tz = pytz.timezone(settings.TIME_ZONE)
+        self.tz = pytz.timezone(timezone) if timezone else None
+        if self.tz and self.tz.zone == self.server_tz.zone:
+            self.tz = None
+
+        self.date_from = truncate(_as_datetime(date_from), bucket)
+        self.date_to = _as_datetime(date_to)
+        self._labels = None
+        self._groups = None
+
+    def to_local(self, value):
+        """Converts server time to time in the series timezone"""
+        if not self.tz:
+            return value
+        value = self.server_tz.localize(value).astimezone(self.tz)
+        return value.replace(tzinfo=None)
+
+    def to_server(self, value):
+        """Converts time in the series timezone to server time"""
+        if not self.tz:
+            return value
+        value = self.tz.localize(value).astimezone(self.server_tz)
+        return value.replace(tzinfo=None)
+
+    def get_db_unit(self):
+        """
+        Returns unit used to truncate timestamps in the database. Without
+        timezone conversion it is the bucket itself (weeks are counted
+        per day), otherwise it has to be fine enough for the timezones
+        offset difference.
+        """
+        unit = 'day' if self.bucket == 'week' else self.bucket
+        if not self.tz:
+            return unit
+        for date in (self.date_from, self.date_to):
+            offset = self.tz.utcoffset(date) - \
+                self.server_tz.utcoffset(date)
+            if offset.seconds % 3600:
+                return 'minute'
+        return unit if unit == 'minute' else 'hour'
+
+    def get_queryset(self):
+        lookup = {
+            '%s__gte' % self.field: self.to_server(self.date_from),
+            '%s__lt' % self.field: self.to_server(self.date_to),
+        }
+        return self.queryset.filter(**lookup).order_by()
+
+    def fetch(self):
+        """
+        Yields tuples (time, group, count) with times in the series timezone;
+        counts are aggregated by the database whenever possible
+        """
+        queryset = self.get_queryset()
+        connection = connections[queryset.db]
+        model = queryset.model
+        column = '%s.%s' % (connection.ops.quote_name(model._meta.db_table),
+            connection.ops.quote_name(model._meta.get_field(self.field).column))
+        sql = truncate_sql(connection, self.get_db_unit(), column)
+
+        fields = [self.group_by] if self.group_by else []
+        if sql:
+            rows = queryset.extra(select={'bucket': sql})
+            rows = rows.values('bucket', *fields).annotate(count=Count('pk'))
+            for row in rows:
+                yield (self.to_local(_to_datetime(row['bucket'])),
+                       row.get(self.group_by), row['count'])
+        else:
+            rows = queryset.values_list(self.field, *fields).iterator()
+            for row in rows:
+                group = row[1] if self.group_by else None
+                yield self.to_local(row[0]), group, 1
+
+    def compute(self):
+        labels = []
+        step = BUCKETS[self.bucket]
+        date = self.date_from
+        while date < self.date_to:
+            labels.append(date)
+            date += step
+        indexes = dict((label, i) for i, label in enumerate(labels))
+
+        groups = {}
+        for time, group, count in self.fetch():
+            i = indexes.get(truncate(time, self.bucket))
+            if i is None:
+                continue
+            if group not in groups:
+                groups[group] = [0] * len(labels)
+            groups[group][i] += count
+
+        if self.max_points and len(labels) > self.max_points:
+            labels, groups = self.downsample(labels, groups)
+        self._labels, self._groups = labels, groups
+
+    def downsample(self, labels, groups):
+        """
+        Merges consecutive buckets, so there are at most max_points of them;
+        every merged bucket is labelled with its first date
+        """
+        size = int(math.ceil(len(labels) / float(self.max_points)))
+        labels = labels[::size]
+        for group, counts in groups.items():
+            groups[group] = [sum(counts[i:i + size])
+                             for i in xrange(0, len(counts), size)]
+        return labels, groups
+
+    @property
+    def labels(self):
+        """Beginnings of buckets"""
+        if self._labels is None:
+            self.compute()
+        return self._labels
+
+    @property
+    def groups(self):
+        """Dictionary mapping values of the group_by field to counts"""
+        if self._groups is None:
+            self.compute()
+        return self._groups
+
+    @property
+    def counts(self):
+        """Total number of objects in every bucket"""
+        groups = self.groups.values()
+        if not groups:
+            return [0] * len(self.labels)
+        return [sum(values) for values in zip(*groups)]
+
+    def add_to_chart(self, chart, label_name, counts_name=None):
+        """
+        Adds column with buckets and column(s) with counts to the chart.
+        Grouped series add one column per group, named with the group value.
+        """
+        if self.bucket in ('day', 'week'):
+            chart.add_column(label_name, self.labels, DateColumn)
+        else:
+            chart.add_column(label_name, self.labels, DatetimeColumn)
+        if self.group_by:
+            for group in sorted(self.groups):
+                chart.add_column(unicode(group), self.groups[group],
+                                 NumberColumn)
+        else:
+            chart.add_column(counts_name, self.counts, NumberColumn)
+        return chart
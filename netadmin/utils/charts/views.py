@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2012 Adriano Monteiro Marques
+#
+# Author: Piotrek Wasilewski <wasilewski.piotrek@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse, Http404
+
+
+# number of seconds the chart data is available at the endpoint
+CHART_DATA_TIMEOUT = getattr(settings, 'CHART_DATA_TIMEOUT', 300)
+
+
+def is_cache_shared():
+    """
+    Returns True if the cache is shared by all processes serving the site,
+    so the chart data stored while rendering a page can be fetched later
+    by another process
+    """
+    return not isinstance(cache, (DummyCache, LocMemCache))
+
+def cache_chart(chart, user, timeout=CHART_DATA_TIMEOUT):
+    """
+    Stores chart data in the cache and returns its key; the data is
+    available only to the given user
+    """
+    key = uuid.uuid4().hex
+    cache.set('chart:%s' % key, (user.pk, chart.to_json()), timeout)
+    return key
+
+def get_request_id(tqx):
+    """
+    Returns request id from the tqx parameter sent by the Google
+    Visualization Query, e.g. 'reqId:1;out:json'
+    """
+    for param in tqx.split(';'):
+        name, sep, value = param.partition(':')
+        if name.strip() == 'reqId':
+            return value.strip()
+    return '0'
+
+@login_required
+def chart_data(request, key):
+    """Returns cached chart data in the Data Source wire format
+    """
+    entry = cache.get('chart:%s' % key)
+    if entry is None:
+        raise Http404
+    owner_id, table = entry
+    if owner_id != request.user.pk:
+        raise Http404
+    request_id = get_request_id(request.GET.get('tqx', ''))
+    if not request_id.isdigit():
+        request_id = '0'
+    content = "google.visualization.Query.setResponse(" \
+              "{\"version\":\"0.6\",\"reqId\":\"%s\",\"status\":\"ok\"," \
+              "\"table\":%s});" % (request_id, table)
+    return HttpResponse(content, mimetype='text/javascript')
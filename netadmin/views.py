@@ -26,6 +26,8 @@ from django.views.generic.simple import direct_to_template, redirect_to
 from netadmin.forms import SearchForm
 from netadmin.events.models import Event
 from netadmin.networks.models import Host, Network
+from netadmin.search_utils import SEARCH_MODELS, SEARCH_MAX_RESULTS, \
+    TopResultsPaginator, search_objects, paginate_results
 
 
 def home(request):
@@ -52,18 +54,21 @@ def search_haystack(request):
 
     """
 
-    from haystack.query import SearchQuerySet
-
     query = request.GET.get('q')
 
-    results = SearchQuerySet().filter(content=query)
-
     context = {
         'query': query,
-        'results': results,
         'form': SearchForm(request.GET)
     }
 
+    if query:
+        # every type of objects is paginated separately and only the most
+        # relevant results are available
+        for name, model in SEARCH_MODELS:
+            results = search_objects(request.user, query, model)
+            page = request.GET.get('%s_page' % name, 1)
+            context['results_%s' % name] = paginate_results(results, page)
+
     return direct_to_template(request, extra_context=context,
                               template='search.html')
 
@@ -73,24 +78,21 @@ def search_nonrel(request):
 
     """
 
-    from search.core import search
-
     query = request.GET.get('q')
 
     if query:
-        events = search(Event, query).order_by('-timestamp')
-        events = filter(lambda e: e.source_host.has_access(request.user), events)
-
-        hosts = search(Host, query)
-        hosts = filter(lambda h: h.has_access(request.user), hosts)
-        
-        networks = search(Network, query)
-        networks = filter(lambda n: n.has_access(request.user), networks)
+        events = search_objects(request.user, query, Event)
+        hosts = search_objects(request.user, query, Host)
+        networks = search_objects(request.user, query, Network)
 
         context = {
-            'results_events': events,
-            'results_hosts': hosts,
-            'results_networks': networks,
+            # events are paginated by the events_list tag
+            'results_events': events[:SEARCH_MAX_RESULTS],
+            'results_events_count': TopResultsPaginator(events).count,
+            'results_hosts': paginate_results(hosts,
+                request.GET.get('hosts_page', 1)),
+            'results_networks': paginate_results(networks,
+                request.GET.get('networks_page', 1)),
             'query': query,
             'form': SearchForm(request.GET)
         }
@@ -47,6 +47,8 @@ from netadmin.networks.models import Host, Network
 from netadmin import notifier
 from netadmin.events.models import Event
 from netadmin.events.utils import get_event_data, EventParseError
+from netadmin.search_utils import SEARCH_MODELS, SEARCH_RESULTS_PER_PAGE, \
+    search_objects, paginate_results, get_object
 
 from views import api_error, api_ok, api_response
 
@@ -345,3 +347,67 @@ class EventHandler(BaseHandler):
             return api_error(_('Event does not exist'))
         
         return api_response(event.api_detail())
+
+class SearchHandler(BaseHandler):
+    """
+    Search handler gives access to events, hosts and networks matching
+    a query. This is a part of the public API.
+    """
+    allowed_methods = ('GET', )
+
+    def read(self, request):
+        """
+        Returns a page of the most relevant results for every type of
+        objects; only objects accessible to the user are returned.
+
+        Method: GET
+        URL: /api/search/
+
+        Request parameters:
+            * q - search query
+            * type (optional) - search only for objects of this type;
+              allowed values are: events, hosts, networks
+            * page (optional) - number of the page (by default: 1)
+            * limit (optional) - number of results on a page (at most 100)
+
+        Response:
+            * query
+            * events, hosts, networks
+                ** count - number of results (at most SEARCH_MAX_RESULTS)
+                ** page - number of the page
+                ** num_pages - number of pages
+                ** results - list of objects (as in lists of objects)
+        """
+        query = request.GET.get('q')
+        if not query:
+            return api_error(_('The search query is empty'))
+
+        types = dict(SEARCH_MODELS)
+        type_name = request.GET.get('type')
+        if type_name:
+            if type_name not in types:
+                return api_error(_('Unknown type of objects'))
+            models = [(type_name, types[type_name])]
+        else:
+            models = SEARCH_MODELS
+
+        try:
+            per_page = int(request.GET.get('limit', SEARCH_RESULTS_PER_PAGE))
+        except ValueError:
+            return api_error(_('Invalid limit'))
+        per_page = min(max(per_page, 1), 100)
+
+        response = {'query': query}
+        for name, model in models:
+            results = search_objects(request.user, query, model)
+            page = paginate_results(results, request.GET.get('page', 1),
+                                    per_page)
+            objects = [get_object(result) for result in page.object_list]
+            response[name] = {
+                'count': page.paginator.count,
+                'page': page.number,
+                'num_pages': page.paginator.num_pages,
+                'results': [obj.api_list() for obj in objects
+                            if obj is not None]
+            }
+        return api_response(response)
@@ -27,6 +27,7 @@ try:
 except ImportError:
     import json
 
+from django.conf import settings
 from django.test import TestCase
 from django.test.client import Client
 from django.core.urlresolvers import reverse
@@ -34,6 +35,7 @@ from django.contrib.auth.models import User
 
 from netadmin.networks.models import Host
 from netadmin.events.models import Event, EventType
+from netadmin.search_utils import TopResultsPaginator
 
 
 class WebAPITest(TestCase):
@@ -176,3 +178,50 @@ class WebAPITest(TestCase):
         response = self.client.get(url)
         j = json.loads(response.content)
         self.assertIn('events', j.keys())
+
+    def test_search(self):
+        """Search requires a query and a known type of objects"""
+        url = reverse('api_search')
+        j = json.loads(self.client.get(url).content)
+        self.assertEqual(j['status'], 'error')
+
+        j = json.loads(self.client.get(url, {'q': 'host',
+                                             'type': 'users'}).content)
+        self.assertEqual(j['status'], 'error')
+
+    def test_search_results(self):
+        """Search should return only objects accessible to the user"""
+        if 'haystack' in settings.INSTALLED_APPS:
+            # hosts are indexed when saved; don't leave them in the index
+            from haystack import site
+            backend = site.get_index(Host).backend
+            backend.clear(models=[Host])
+            self.addCleanup(backend.clear, models=[Host])
+        other = User.objects.create_user('other', 'other@something.com',
+                                         'pass')
+        own = Host.objects.create(name='alpha server', ipv4='10.0.0.1',
+                                  user=self.user)
+        hidden = Host.objects.create(name='alpha router', ipv4='10.0.0.2',
+                                     user=other)
+        url = reverse('api_search')
+
+        j = json.loads(self.client.get(url, {'q': 'alpha',
+                                             'type': 'hosts'}).content)
+        self.assertNotIn('events', j.keys())
+        self.assertEqual(j['hosts']['count'], 1)
+        self.assertEqual([host['id'] for host in j['hosts']['results']],
+                         [own.pk])
+
+        hidden.share(self.user)
+        j = json.loads(self.client.get(url, {'q': 'alpha',
+                                             'type': 'hosts'}).content)
+        self.assertEqual(j['hosts']['count'], 2)
+        self.assertEqual(set(host['id'] for host in j['hosts']['results']),
+                         set([own.pk, hidden.pk]))
+
+    def test_search_paginator(self):
+        """Only the top results should be paginated"""
+        paginator = TopResultsPaginator(Host.objects.all(), 3, max_results=5)
+        self.assertEqual(paginator.count, 5)
+        self.assertEqual(paginator.num_pages, 2)
+        self.assertEqual(len(paginator.page(2).object_list), 2)
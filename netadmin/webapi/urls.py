@@ -23,7 +23,8 @@ from django.conf.urls.defaults import patterns, url
 from piston.resource import Resource
 from piston.authentication import NoAuthentication, HttpBasicAuthentication
 
-from handlers import HostHandler, NetworkHandler, EventHandler
+from handlers import HostHandler, NetworkHandler, EventHandler, \
+    SearchHandler
 
 
 # While running tests we don't have to use authentication
@@ -37,6 +38,7 @@ ad = { 'authentication': auth }
 host_handler = Resource(HostHandler, **ad)
 event_handler = Resource(EventHandler, **ad)
 net_handler = Resource(NetworkHandler, **ad)
+search_handler = Resource(SearchHandler, **ad)
 
 
 urlpatterns = patterns('netadmin.webapi.views',
@@ -52,4 +54,7 @@ urlpatterns = patterns('netadmin.webapi.views',
     url(r'^event/report/$', event_handler, name='api_report_event'),
     url(r'^event/(?P<event_id>\d+)/$', event_handler, name='api_event_detail'),
     url(r'^event/list/$', event_handler, name='api_event_list'),
+
+    # Search handler
+    url(r'^search/$', search_handler, name='api_search'),
 )
@@ -106,6 +106,8 @@ HAYSTACK_SITECONF = 'search_indexes'
 HAYSTACK_SEARCH_ENGINE = 'whoosh'
 HAYSTACK_WHOOSH_PATH = os.path.join(os.path.dirname(__file__), 'whoosh_index')
 
+REPORTS_PATH = os.path.join(os.path.dirname(__file__), 'reports')
+
 try:
     from local_settings import *
 except ImportError:
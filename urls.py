@@ -36,6 +36,7 @@ urlpatterns = patterns('',
     (r'^user/', include('netadmin.users.urls')),
     (r'^notifications/', include('netadmin.notifier.urls')),
     (r'^plugins/', include('netadmin.plugins.urls')),
+    (r'^charts/', include('netadmin.utils.charts.urls')),
     (r'^admin/', include(admin.site.urls)),
     url(r'^search/', 'netadmin.views.search', name='search'),
 